@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from workbook import write_workbook
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {'min': min(timings), 'median': statistics.median(timings), 'repeat': repeat}
+
+
+def benchmark_loader(filepath, options, repeat):
+    from pytbul.loader import load_from_xls
+
+    return {
+        'load_from_xls': measure(lambda: load_from_xls(filepath, **options), repeat),
+        'load_from_xls[compact]': measure(lambda: load_from_xls(filepath, compact=True, **options), repeat),
+    }
+
+
+def benchmark_plotting(df, repeat):
+    from pytbul import plotting
+    from pytbul.stats import Statistics
+
+    student = df['name'].iloc[0]
+    skill = df['skill'].iloc[0]
+    calls = {
+        'skills_distribution': lambda stats: plotting.skills_distribution(df, True, stats=stats),
+        'tests_results_evolution': lambda stats: plotting.tests_results_evolution(df, None, True, True, stats=stats),
+        'tests_results_evolution[skill]': lambda stats: plotting.tests_results_evolution(df, skill, True, True,
+                                                                                         stats=stats),
+        'skills_evolution': lambda stats: plotting.skills_evolution(df, True, True, stats=stats),
+        'results_overview[name]': lambda stats: plotting.results_overview(df, False, 'name', None, stats=stats),
+        'results_overview[code]': lambda stats: plotting.results_overview(df, False, 'code', None, stats=stats),
+        'results_overview[name,page]': lambda stats: plotting.results_overview(df, False, 'name', None, True, 0, 30,
+                                                                               stats=stats),
+        'student_results': lambda stats: plotting.student_results(df, student, False, True, True, None,
+                                                                  stats=stats),
+    }
+
+    results = {}
+    for name, call in calls.items():
+        # Cold: statistics computed for the call, warm: statistics shared as in the GUI
+        results[name + '[cold]'] = measure(lambda: call(Statistics(df)), repeat)
+        stats = Statistics(df)
+        call(stats)
+        results[name + '[warm]'] = measure(lambda: call(stats), repeat)
+    return results
+
+
+def benchmark_frames(df, repeat):
+    from PyQt5 import QtWidgets
+    from pytbul import gui
+    from pytbul.stats import Statistics
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+
+    def build(cls):
+        frame = cls(None, df, Statistics(df))
+        frame.update_view()
+        frame.deleteLater()
+        app.processEvents()
+
+    return {
+        cls.__name__: measure(lambda: build(cls), repeat)
+        for cls in [gui.FrameSkills, gui.FrameEvolution, gui.FrameGeneral, gui.FrameStudents, gui.FrameProgression,
+                    gui.FrameSummary]
+    }
+
+
+def compare(results, previous):
+    print('{:40} {:>10} {:>10} {:>8}'.format('benchmark', 'before', 'after', 'ratio'))
+    for name, timing in sorted(results['benchmarks'].items()):
+        before = previous['benchmarks'].get(name)
+        if before is not None:
+            print('{:40} {:10.4f} {:10.4f} {:8.2f}'.format(name, before['min'], timing['min'],
+                                                         timing['min'] / before['min']))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmarks of pytbul on a synthetic workbook.')
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--tests', type=int, default=40, help='number of tests per period')
+    parser.add_argument('--periods', type=int, default=4)
+    parser.add_argument('--skills', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-gui', action='store_true', help='skip the Frame* benchmarks')
+    parser.add_argument('-o', '--output', default='benchmarks.json', help='file to write the results to')
+    parser.add_argument('--compare', help='results of a previous run to compare with')
+    args = parser.parse_args(argv[1:])
+
+    # Built figures are cached by default, which would hide the rendering cost
+    from pytbul import plotting
+    from pytbul.loader import load_from_xls
+    plotting.figure_cache.max_size = 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, 'synthetic.xls')
+        options = write_workbook(filepath, students=args.students, tests=args.tests, periods=args.periods,
+                                 skills=args.skills)
+
+        benchmarks = benchmark_loader(filepath, options, args.repeat)
+        df = load_from_xls(filepath, **options)
+
+    benchmarks.update(benchmark_plotting(df, args.repeat))
+    if not args.no_gui:
+        benchmarks.update(benchmark_frames(df, args.repeat))
+
+    import matplotlib
+    import pandas
+    results = {
+        'parameters': {key: getattr(args, key) for key in ['students', 'tests', 'periods', 'skills', 'repeat']},
+        'rows': len(df),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pandas': pandas.__version__,
+            'matplotlib': matplotlib.__version__,
+        },
+        'benchmarks': benchmarks,
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    else:
+        for name, timing in sorted(benchmarks.items()):
+            print('{:40} {:10.4f}s'.format(name, timing['min']))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,43 @@
+import os
+import re
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import time budget of pytbul.gui, i.e. what is paid before the main window shows up.
+# It can be changed through PYTBUL_STARTUP_BUDGET (in seconds), e.g. on slow machines.
+BUDGET = float(os.environ.get('PYTBUL_STARTUP_BUDGET', 0.3))
+
+# Modules that must only be imported once a file is opened (or in the background)
+DEFERRED = ['pandas', 'numpy', 'matplotlib', 'seaborn', 'xlrd']
+
+
+def import_times(module):
+    # Modules are imported from the root of the repository, wherever this is run from
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module], cwd=ROOT,
+                             stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    times = {}
+    for line in process.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)', line)
+        if match:
+            times[match.group(4)] = int(match.group(2)) / 1000000
+    return times
+
+
+def main():
+    times = import_times('pytbul.gui')
+    total = times['pytbul.gui']
+    deferred = [module for module in DEFERRED if module in times]
+
+    print('pytbul.gui imported in {:.3f}s (budget: {:.3f}s)'.format(total, BUDGET))
+    if deferred:
+        print('Modules that should be deferred: {}'.format(', '.join(deferred)))
+
+    return 0 if total <= BUDGET and not deferred else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import datetime
+import os
+import random
+import zipfile
+
+from xml.sax.saxutils import escape, quoteattr
+
+import xlwt
+
+
+def write_workbook(filepath, *, students=30, tests=10, periods=4, skills=3, seed=0,
+                   names_sheet='Nom', name_pos=(3, 1), test_pos=(0, 2), max_decal=1, comp_decal=2,
+                   stopword='Total SSFL', changes=None):
+    # Write a synthetic workbook following the CF layout expected by load_from_xls,
+    # and return the loader options needed to read it back. The file is written
+    # as .xls, .xlsx or .ods after its extension. Cells can be overwritten through
+    # changes, a dict {(sheet, row, column): value}.
+    rnd = random.Random(seed)
+    sheets = {}
+
+    def write(sheet, row, column, value):
+        rows = sheets.setdefault(sheet, [])
+        rows.extend([] for _ in range(row + 1 - len(rows)))
+        rows[row].extend('' for _ in range(column + 1 - len(rows[row])))
+        rows[row][column] = value
+
+    write('Admin', 0, 0, 'Feuille ignorée par le chargement')
+
+    write(names_sheet, 0, 0, 'Élèves')
+    for student in range(students):
+        write(names_sheet, name_pos[0] + student, name_pos[1], 'Élève {:04d}'.format(student + 1))
+
+    tests_sheets = ['B{}'.format(period + 1) for period in range(periods)]
+    for period, name in enumerate(tests_sheets):
+        weights = [rnd.choice([5, 10, 20]) for _ in range(tests)]
+
+        for test in range(tests):
+            column = test_pos[1] + test
+            write(name, test_pos[0], column, 'Test {}.{}'.format(period + 1, test + 1))
+            write(name, test_pos[0] + max_decal, column, weights[test])
+            write(name, test_pos[0] + comp_decal, column, 'C{}'.format(rnd.randrange(skills) + 1))
+        write(name, test_pos[0], test_pos[1] + tests, stopword)
+
+        for student in range(students):
+            row = name_pos[0] + student
+            level = rnd.random()
+            for test in range(tests):
+                # About 5% of missing results
+                if rnd.random() < 0.05:
+                    continue
+                value = round(min(1, max(0, rnd.gauss(level, 0.2))) * weights[test])
+                write(name, row, test_pos[1] + test, value)
+            write(name, row, test_pos[1] + tests, 0)
+
+    for (sheet, row, column), value in (changes or {}).items():
+        write(sheet, row, column, value)
+
+    writers = {'.xlsx': _write_xlsx, '.ods': _write_ods}
+    writers.get(os.path.splitext(filepath)[1].lower(), _write_xls)(filepath, sheets)
+
+    start = datetime.date(2015, 9, 1)
+    tests_dates = []
+    for period in range(periods + 1):
+        month = start.month - 1 + period * 10 // periods
+        tests_dates.append((start.year + month // 12, month % 12 + 1))
+
+    return dict(names_sheet=names_sheet, tests_sheets=tests_sheets, tests_dates=tests_dates,
+                name_pos=name_pos, test_pos=test_pos, max_decal=max_decal, comp_decal=comp_decal,
+                tests_stopwords=['', stopword])
+
+
+# Cells are strings or numbers, '' for empty cells
+
+def _write_xls(filepath, sheets):
+    book = xlwt.Workbook()
+    for name, rows in sheets.items():
+        sheet = book.add_sheet(name)
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                if value != '':
+                    sheet.write(r, c, value)
+    book.save(filepath)
+
+
+def _column_name(index):
+    name = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(ord('A') + remainder) + name
+    return name
+
+
+def _write_xlsx(filepath, sheets):
+    # Minimal SpreadsheetML package, with shared strings
+    strings = {}
+    files = {}
+    for n, (name, rows) in enumerate(sheets.items(), 1):
+        xml = ['<?xml version="1.0" encoding="UTF-8"?>'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>']
+        for r, row in enumerate(rows):
+            if not any(value != '' for value in row):
+                continue
+            xml.append('<row r="{}">'.format(r + 1))
+            for c, value in enumerate(row):
+                reference = '{}{}'.format(_column_name(c), r + 1)
+                if isinstance(value, str) and value != '':
+                    index = strings.setdefault(value, len(strings))
+                    xml.append('<c r="{}" t="s"><v>{}</v></c>'.format(reference, index))
+                elif value != '':
+                    xml.append('<c r="{}"><v>{!r}</v></c>'.format(reference, value))
+            xml.append('</row>')
+        xml.append('</sheetData></worksheet>')
+        files['xl/worksheets/sheet{}.xml'.format(n)] = ''.join(xml)
+
+    files['xl/workbook.xml'] = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>{}</sheets></workbook>'
+        .format(''.join('<sheet name={} sheetId="{}" r:id="rId{}"/>'.format(quoteattr(name), n, n)
+                        for n, name in enumerate(sheets, 1))))
+    files['xl/_rels/workbook.xml.rels'] = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{}</Relationships>'
+        .format(''.join('<Relationship Id="rId{0}" Target="worksheets/sheet{0}.xml" Type="http://schemas.'
+                        'openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'.format(n)
+                        for n in range(1, len(sheets) + 1))))
+    files['xl/sharedStrings.xml'] = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">{}</sst>'
+        .format(''.join('<si><t>{}</t></si>'.format(escape(string)) for string in strings)))
+
+    with zipfile.ZipFile(filepath, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+
+
+def _write_ods(filepath, sheets):
+    # Minimal OpenDocument spreadsheet, with repeated empty cells and rows as
+    # written by LibreOffice
+    xml = ['<?xml version="1.0" encoding="UTF-8"?>'
+           '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+           'xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0" '
+           'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"><office:body><office:spreadsheet>']
+    for name, rows in sheets.items():
+        xml.append('<table:table table:name={}>'.format(quoteattr(name)))
+        for row in rows:
+            xml.append('<table:table-row>')
+            for value in row:
+                if value == '':
+                    xml.append('<table:table-cell/>')
+                elif isinstance(value, str):
+                    xml.append('<table:table-cell office:value-type="string"><text:p>{}</text:p></table:table-cell>'
+                               .format(escape(value)))
+                else:
+                    xml.append('<table:table-cell office:value-type="float" office:value="{0!r}">'
+                               '<text:p>{0!r}</text:p></table:table-cell>'.format(value))
+            xml.append('<table:table-cell table:number-columns-repeated="1000"/></table:table-row>')
+        xml.append('<table:table-row table:number-rows-repeated="1048000">'
+                   '<table:table-cell table:number-columns-repeated="1024"/></table:table-row></table:table>')
+    xml.append('</office:spreadsheet></office:body></office:document-content>')
+
+    with zipfile.ZipFile(filepath, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('mimetype', 'application/vnd.oasis.opendocument.spreadsheet')
+        archive.writestr('content.xml', ''.join(xml))
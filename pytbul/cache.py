@@ -0,0 +1,117 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+
+# Bump when the layout of cached dataframes changes, to ignore older entries
+CACHE_VERSION = 1
+
+
+class DataFrameCache:
+    def __init__(self, directory, max_size=100 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, filepath, *options):
+        # Pickles are not portable across pandas versions, hence its version in the key
+        import pandas
+
+        stat = os.stat(filepath)
+
+        content = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                content.update(chunk)
+
+        key = hashlib.sha1()
+        key.update(repr((CACHE_VERSION, pandas.__version__, os.path.abspath(filepath), stat.st_size,
+                         stat.st_mtime_ns, content.hexdigest(), options)).encode('utf-8'))
+        return key.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+        import pandas
+
+        path = self._path(key)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return None
+
+        # Any entry that cannot be read back is a miss, and is removed
+        try:
+            with f:
+                df = pickle.load(f)
+        except Exception:
+            df = None
+
+        if not isinstance(df, pandas.DataFrame):
+            self._remove(path)
+            return None
+
+        # Mark entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return df
+
+    def put(self, key, df):
+        # Best effort: failing to cache a frame must not fail its loading
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+            tmp_path = None
+        except Exception:
+            return
+        finally:
+            if tmp_path is not None:
+                self._remove(tmp_path)
+
+        self.evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+
+        entries = []
+        for name in names:
+            if name.endswith('.pkl'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, name)))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        # Remove least recently used entries until the cache fits in max_size
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self._remove(path)
@@ -1,12 +1,15 @@
+import os
+import weakref
 from PyQt5 import QtGui, QtCore, QtWidgets
-import matplotlib
-matplotlib.use("Qt5Agg")
 
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas, NavigationToolbar2QT as NavigationToolbar
+# pandas, matplotlib and seaborn are slow to import: they are imported on first
+# use, or in the background once the main window is shown (see preload_modules).
+# Setting the backend through the environment does not require matplotlib yet.
+os.environ.setdefault('MPLBACKEND', 'Qt5Agg')
 
 from functools import partial
-from . import plotting
-from .loader import load_from_xls
+from .cache import DataFrameCache
+from .timing import Timings, profiler, recorded_in, timings
 
 ABOUT_TITLE = 'Pytbul - visualisation de bulletins scolaires'
 ABOUT_URL = 'https://github.com/AlexandreDecan/pytbul'
@@ -24,32 +27,74 @@ ABOUT_CONTENT = '\n'.join([
 class GenericThread(QtCore.QThread):
     taskFinished = QtCore.pyqtSignal()
 
+    # Threads still alive, waited for before exiting
+    instances = weakref.WeakSet()
+
     def __init__(self, func, *args, **kwargs):
         super().__init__()
+        GenericThread.instances.add(self)
         self._func = func
         self._args = args
         self._kwargs = kwargs
         self.result = None
+        self.error = None
 
     def __del__(self):
-        self.wait()
+        # The Qt object may already be deleted, e.g. when the interpreter exits
+        try:
+            self.wait()
+        except RuntimeError:
+            pass
 
     def run(self):
-        self.result = self._func(*self._args, **self._kwargs)
+        try:
+            self.result = profiler.run(self._func, *self._args, **self._kwargs)
+        except Exception as e:
+            self.error = e
         self.taskFinished.emit()
 
 
+def preload_modules():
+    from matplotlib.backends import backend_qt5agg
+    from . import loader, plotting, stats
+
+
 class MainWindow(QtWidgets.QMainWindow):
+    # Progress of the loading run by given thread
+    loadingProgressed = QtCore.pyqtSignal(object, int, int, str)
+
     def __init__(self):
         super().__init__()
 
         self.df = None
+        self.loading = None
 
         # Recent opened files
         self.recent_files = QtCore.QSettings().value('menu/recentFiles', None)
         self.recent_files = [] if self.recent_files is None else self.recent_files
         self.recent_files_maximum = 8
 
+        # Cache of parsed files, stored next to the settings
+        settings_path = QtCore.QSettings(QtCore.QSettings.IniFormat, QtCore.QSettings.UserScope,
+                                         QtCore.QCoreApplication.organizationName(),
+                                         QtCore.QCoreApplication.applicationName()).fileName()
+        cache_directory = QtCore.QDir(QtCore.QFileInfo(settings_path).absolutePath()).filePath('cache')
+        self.cache = DataFrameCache(cache_directory, max_size=100 * 1024 * 1024)
+
+        # Results of previous years, stored next to the settings by default
+        default_store = QtCore.QDir(QtCore.QFileInfo(settings_path).absolutePath()).filePath('historique.sqlite')
+        self.store_path = QtCore.QSettings().value('history/path', default_store)
+
+        # The open file is reloaded when it changes, once its writing seems over
+        self.filepath = None
+        self.fingerprints = None
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.file_changed)
+        self.reload_timer = QtCore.QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(500)
+        self.reload_timer.timeout.connect(self.reload_file)
+
         # File menu
         fileMenu = self.menuBar().addMenu('&Fichier')
 
@@ -57,6 +102,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self.menu_open.triggered.connect(self.choose_file)
         fileMenu.addAction(self.menu_open)
 
+        self.menu_open_many = QtWidgets.QAction('Ouvrir &plusieurs fichiers', fileMenu)
+        self.menu_open_many.triggered.connect(self.choose_files)
+        fileMenu.addAction(self.menu_open_many)
+
         # Submenu recent items
         submenu_recent = fileMenu.addMenu('&Récemment ouverts')
         self.menu_recent_items = []
@@ -74,14 +123,44 @@ class MainWindow(QtWidgets.QMainWindow):
         submenu_recent.addAction(remove_recents)
         self.update_recent_files()
 
+        self.menu_clear_cache = QtWidgets.QAction('&Vider le cache', fileMenu)
+        self.menu_clear_cache.triggered.connect(self.cache.clear)
+        fileMenu.addAction(self.menu_clear_cache)
+
         self.menu_close = QtWidgets.QAction('&Fermer', fileMenu)
-        self.menu_close.triggered.connect(partial(self.set_dataframe, None))
+        self.menu_close.triggered.connect(self.close_file)
         fileMenu.addAction(self.menu_close)
 
         self.menu_quit = QtWidgets.QAction('&Quitter', fileMenu)
         self.menu_quit.triggered.connect(QtWidgets.qApp.quit)
         fileMenu.addAction(self.menu_quit)
 
+        # History menu
+        history_menu = self.menuBar().addMenu('&Historique')
+
+        self.menu_history_import = QtWidgets.QAction('&Importer des fichiers', history_menu)
+        self.menu_history_import.triggered.connect(self.import_files)
+        history_menu.addAction(self.menu_history_import)
+
+        self.menu_history_browse = QtWidgets.QAction('&Consulter', history_menu)
+        self.menu_history_browse.triggered.connect(self.browse_history)
+        history_menu.addAction(self.menu_history_browse)
+
+        self.menu_history_choose = QtWidgets.QAction('&Choisir le fichier d\'historique', history_menu)
+        self.menu_history_choose.triggered.connect(self.choose_store)
+        history_menu.addAction(self.menu_history_choose)
+
+        # Detached plots menu
+        windows_menu = self.menuBar().addMenu('F&enêtres')
+
+        self.menu_windows_close = QtWidgets.QAction('&Fermer les graphiques détachés', windows_menu)
+        self.menu_windows_close.triggered.connect(detached_plots.close_all)
+        windows_menu.addAction(self.menu_windows_close)
+
+        self.menu_windows_maximum = QtWidgets.QAction('&Nombre maximal de graphiques détachés', windows_menu)
+        self.menu_windows_maximum.triggered.connect(self.choose_max_figures)
+        windows_menu.addAction(self.menu_windows_maximum)
+
         # About
         help_menu = self.menuBar().addMenu('&Aide')
         github = QtWidgets.QAction('Site web', help_menu)
@@ -91,9 +170,58 @@ class MainWindow(QtWidgets.QMainWindow):
         help_menu.addAction(github)
         help_menu.addAction(about)
 
+        help_menu.addSeparator()
+        self.menu_profile = QtWidgets.QAction('&Profiler la session', help_menu)
+        self.menu_profile.setCheckable(True)
+        self.menu_profile.setChecked(profiler.active)
+        self.menu_profile.toggled.connect(self.toggle_profiling)
+        help_menu.addAction(self.menu_profile)
+
+        # Duration of the stages of the last loading, and of the last rendering
+        self.loading_timings = QtWidgets.QLabel(self.statusBar())
+        self.statusBar().addPermanentWidget(self.loading_timings)
+
+        # Number of detached plots, and memory used by their figures
+        detached_plots.set_max_figures(int(QtCore.QSettings().value('plots/maxDetached', detached_plots.max_figures)))
+        self.detached_status = QtWidgets.QLabel(self.statusBar())
+        self.statusBar().addPermanentWidget(self.detached_status)
+        detached_plots.changed.connect(self.update_detached_status)
+        self.update_detached_status()
+
         self.update_ui()
 
+    def choose_max_figures(self):
+        maximum, ok = QtWidgets.QInputDialog.getInt(self, 'Graphiques détachés',
+                                                    'Nombre maximal de graphiques détachés ouverts :',
+                                                    detached_plots.max_figures, 1, 50)
+        if ok:
+            QtCore.QSettings().setValue('plots/maxDetached', maximum)
+            detached_plots.set_max_figures(maximum)
+
+    def update_detached_status(self):
+        count = len(detached_plots)
+        self.detached_status.setVisible(count > 0)
+        self.detached_status.setText('Graphiques détachés : {} ({:.1f} Mo)'.format(count,
+                                                                                  detached_plots.size() / 2 ** 20))
+
+    def toggle_profiling(self, checked):
+        if checked:
+            profiler.start()
+            return
+
+        filepath, ok = QtWidgets.QFileDialog.getSaveFileName(self, 'Enregistrer le profil', 'pytbul.prof',
+                                                            filter='Profil cProfile (*.prof);;Tous les fichiers (*.*)')
+        if not filepath:
+            # Keep profiling until a file is chosen
+            self.menu_profile.blockSignals(True)
+            self.menu_profile.setChecked(True)
+            self.menu_profile.blockSignals(False)
+            return
+        profiler.stop(filepath)
+
     def open_file(self, filepath):
+        from .loader import load_from_xls, read_fingerprints
+
         # Remove from recent opened files
         try:
             self.recent_files.remove(filepath)
@@ -113,21 +241,185 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.critical(self, 'Ouverture d\'un fichier', 'Impossible d\'ouvrir le fichier: %s' % str(e))
             return
 
-        try:
-            dataframe = load_from_xls(filepath)
-        except Exception as e:
-            QtWidgets.QMessageBox.critical(self, 'Ouverture d\'un fichier', 'Impossible de lire le fichier: %s' % str(e))
-            return
+        def load(filepath):
+            fingerprints = read_fingerprints(filepath)
+            return load_from_xls(filepath, cache=self.cache, progress=self.loading_progress), fingerprints
 
+        self.start_loading('Ouverture d\'un fichier', partial(self.open_file_finished, filepath), load, filepath)
+
+    def open_file_finished(self, filepath, result):
+        dataframe, fingerprints = result
         self.set_dataframe(dataframe)
+        self.watch_file(filepath, fingerprints)
 
         # Add to recent opened files
         self.recent_files.insert(0, filepath)
         self.update_recent_files()
 
-    def set_dataframe(self, dataframe):
+    def open_files(self, filepaths, scope):
+        from .loader import load_many
+
+        self.start_loading('Ouverture de fichiers', self.open_files_finished, load_many, filepaths, scope=scope)
+
+    def open_files_finished(self, dataframe):
+        self.set_dataframe(dataframe)
+        self.watch_file(None, None)
+
+    def import_files(self):
+        from .store import ResultsStore, ingest
+
+        filepaths, ok = QtWidgets.QFileDialog.getOpenFileNames(filter='Feuille de calcul (*.xls *.xlsx *.ods);;Tous les fichiers (*.*)')
+        if not filepaths:
+            return
+
+        today = QtCore.QDate.currentDate()
+        year, ok = QtWidgets.QInputDialog.getInt(self, 'Importation dans l\'historique',
+                                                 'Année de début de l\'année scolaire :',
+                                                 today.year() if today.month() >= 9 else today.year() - 1, 1900, 2999)
+        if ok:
+            self.start_loading('Importation dans l\'historique', self.import_files_finished, ingest,
+                               ResultsStore(self.store_path), filepaths, year, progress=self.loading_progress)
+
+    def import_files_finished(self, classes):
+        QtWidgets.QMessageBox.information(self, 'Importation dans l\'historique',
+                                          'Classes importées : %s.' % ', '.join(classes))
+
+    def browse_history(self):
+        from .store import ResultsStore
+
+        store = ResultsStore(self.store_path)
+        dialog = HistoryDialog(self, store)
+        if dialog.exec_() == QtWidgets.QDialog.Accepted:
+            self.start_loading('Consultation de l\'historique', self.browse_history_finished, store.query,
+                               **dialog.filters())
+
+    def browse_history_finished(self, dataframe):
+        if len(dataframe) == 0:
+            QtWidgets.QMessageBox.information(self, 'Consultation de l\'historique', 'Aucun résultat ne correspond.')
+            return
+        self.open_files_finished(dataframe)
+
+    def choose_store(self):
+        filepath, ok = QtWidgets.QFileDialog.getSaveFileName(self, 'Fichier d\'historique', self.store_path,
+                                                             filter='Base SQLite (*.sqlite);;Tous les fichiers (*.*)',
+                                                             options=QtWidgets.QFileDialog.DontConfirmOverwrite)
+        if filepath:
+            self.store_path = filepath
+            QtCore.QSettings().setValue('history/path', filepath)
+
+    def close_file(self):
+        self.set_dataframe(None)
+        self.watch_file(None, None)
+
+    def watch_file(self, filepath, fingerprints):
+        if self.watcher.files():
+            self.watcher.removePaths(self.watcher.files())
+
+        self.filepath = filepath
+        self.fingerprints = fingerprints
+        if filepath is not None:
+            self.watcher.addPath(filepath)
+
+    def file_changed(self, filepath):
+        # Files saved by replacing them are no longer watched
+        if filepath not in self.watcher.files() and QtCore.QFileInfo(filepath).exists():
+            self.watcher.addPath(filepath)
+        self.reload_timer.start()
+
+    def reload_file(self):
+        from .loader import reload_from_xls
+
+        if self.filepath is None or not QtCore.QFileInfo(self.filepath).exists():
+            return
+        elif self.filepath not in self.watcher.files():
+            self.watcher.addPath(self.filepath)
+
+        if self.loading is not None:
+            self.reload_timer.start()
+            return
+
+        self.start_loading('Rechargement du fichier', partial(self.reload_file_finished, self.filepath),
+                           reload_from_xls, self.filepath, self.df, self.fingerprints, cache=self.cache,
+                           progress=self.loading_progress)
+
+    def reload_file_finished(self, filepath, result):
+        dataframe, fingerprints, changed = result
+        if filepath != self.filepath:
+            return
+
+        self.fingerprints = fingerprints
+        if changed:
+            # Keep the current tab and settings
+            frame = self.centralWidget()
+            self.set_dataframe(dataframe, frame.save_state() if isinstance(frame, FrameDataFrame) else None)
+
+    def start_loading(self, title, on_success, func, *args, **kwargs):
+        dialog = QtWidgets.QProgressDialog('Lecture en cours...', 'Annuler', 0, 0, self)
+        dialog.setWindowTitle(title)
+        dialog.setWindowModality(QtCore.Qt.WindowModal)
+        dialog.setMinimumDuration(500)
+        dialog.setValue(0)
+
+        # A cancelled loading may still run when another one starts: each of them has
+        # its own timings, and only updates its own dialog
+        load_timings = Timings()
+
+        def load():
+            with recorded_in(load_timings):
+                return func(*args, **kwargs)
+
+        def progressed(sender, value, maximum, text):
+            if sender is thread:
+                dialog.setMaximum(maximum)
+                dialog.setValue(value)
+                dialog.setLabelText(text)
+
+        thread = GenericThread(load)
+        dialog.canceled.connect(thread.requestInterruption)
+        self.loadingProgressed.connect(progressed)
+        thread.taskFinished.connect(partial(self.loading_finished, thread, dialog, title, on_success, progressed,
+                                            load_timings))
+
+        self.loading = thread
+        thread.start()
+
+    def loading_progress(self, sheets_done, sheets_total, rows):
+        from .loader import LoadCancelled
+
+        # Called from the loading thread
+        thread = QtCore.QThread.currentThread()
+        if thread.isInterruptionRequested():
+            raise LoadCancelled()
+        self.loadingProgressed.emit(thread, sheets_done, sheets_total,
+                                    'Feuilles lues : %d/%d\nLignes construites : %d' % (sheets_done, sheets_total, rows))
+
+    def loading_finished(self, thread, dialog, title, on_success, progressed, load_timings):
+        from .loader import LoadCancelled
+
+        # Interruption requests are forgotten once the thread finished, unlike the dialog
+        cancelled = dialog.wasCanceled() or isinstance(thread.error, LoadCancelled)
+
+        self.loadingProgressed.disconnect(progressed)
+        dialog.reset()
+        dialog.deleteLater()
+        if self.loading is thread:
+            self.loading = None
+
+        if cancelled:
+            return
+        elif thread.error is not None:
+            QtWidgets.QMessageBox.critical(self, title, 'Impossible de lire le fichier: %s' % str(thread.error))
+            return
+
+        self.loading_timings.setText('Chargement : ' + load_timings.summary())
+        on_success(thread.result)
+
+    def set_dataframe(self, dataframe, state=None):
+        from . import plotting
+
+        plotting.figure_cache.clear()
         self.df = dataframe
-        self.update_ui()
+        self.update_ui(state)
 
     def clear_recent_files(self):
         self.recent_files = []
@@ -147,7 +439,7 @@ class MainWindow(QtWidgets.QMainWindow):
         # Update settings
         QtCore.QSettings().setValue('menu/recentFiles', self.recent_files)
 
-    def update_ui(self):
+    def update_ui(self, state=None):
         if self.df is None:
             frame = QtWidgets.QFrame()
             layout = QtWidgets.QVBoxLayout(frame)
@@ -165,11 +457,11 @@ class MainWindow(QtWidgets.QMainWindow):
             self.setCentralWidget(frame)
             self.menu_close.setEnabled(False)
         else:
-            self.setCentralWidget(FrameDataFrame(self, self.df))
+            self.setCentralWidget(FrameDataFrame(self, self.df, state))
             self.menu_close.setEnabled(True)
 
     def choose_file(self):
-        filepath, ok = QtWidgets.QFileDialog.getOpenFileName(filter='Feuille de calcul (*.xls *.ods);;Tous les fichiers (*.*)')
+        filepath, ok = QtWidgets.QFileDialog.getOpenFileName(filter='Feuille de calcul (*.xls *.xlsx *.ods);;Tous les fichiers (*.*)')
 
         if not ok:
             QtWidgets.QMessageBox.warning(self, 'Ouverture d\'un fichier', 'Veuillez choisir un fichier.')
@@ -177,6 +469,144 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             self.open_file(filepath)
 
+    def choose_files(self):
+        filepaths, ok = QtWidgets.QFileDialog.getOpenFileNames(filter='Feuille de calcul (*.xls *.xlsx *.ods);;Tous les fichiers (*.*)')
+
+        if not filepaths:
+            QtWidgets.QMessageBox.warning(self, 'Ouverture de fichiers', 'Veuillez choisir au moins un fichier.')
+            return
+
+        scopes = ['Par classe', 'Globalement']
+        scope, ok = QtWidgets.QInputDialog.getItem(self, 'Ouverture de fichiers', 'Calculer les quartiles :',
+                                                   scopes, 0, False)
+        if ok:
+            self.open_files(filepaths, 'class' if scope == scopes[0] else 'global')
+
+
+class HistoryDialog(QtWidgets.QDialog):
+    # Filters of the results to read from the history; the lists only show stored values
+    def __init__(self, parent, store):
+        super().__init__(parent)
+        self.setWindowTitle('Consultation de l\'historique')
+
+        self.fields = [
+            ('year', 'Année', 'Toutes'),
+            ('class_name', 'Classe', 'Toutes'),
+            ('name', 'Étudiant', 'Tous'),
+            ('period', 'Période', 'Toutes'),
+            ('skill', 'Compétence', 'Toutes'),
+        ]
+        columns = {'year': 'year', 'class_name': 'class', 'name': 'name', 'period': 'period', 'skill': 'skill'}
+
+        layout = QtWidgets.QFormLayout(self)
+        self.boxes = {}
+        for field, label, everything in self.fields:
+            box = QtWidgets.QComboBox(self)
+            box.addItem(everything, None)
+            for value in store.distinct(columns[field]):
+                box.addItem(str(value), value)
+            if field == 'name':
+                box.setEditable(True)
+                box.setInsertPolicy(QtWidgets.QComboBox.NoInsert)
+                box.completer().setFilterMode(QtCore.Qt.MatchContains)
+                box.completer().setCompletionMode(QtWidgets.QCompleter.PopupCompletion)
+            layout.addRow(label, box)
+            self.boxes[field] = box
+
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel, self)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def filters(self):
+        filters = {}
+        for field, box in self.boxes.items():
+            index = box.findText(box.currentText())
+            filters[field] = box.itemData(index) if index >= 0 else box.currentText()
+        return filters
+
+
+class DetachedPlots(QtCore.QObject):
+    # Windows of the detached plots. Each window owns a copy of its figure (the
+    # displayed one is shared with plotting.figure_cache), freed with its canvas
+    # when the window is closed. The oldest windows are closed when more than
+    # max_figures are open.
+    changed = QtCore.pyqtSignal()
+
+    def __init__(self, max_figures=5):
+        super().__init__()
+        self.max_figures = max_figures
+        self.windows = []
+        self.figures = {}
+
+    def __len__(self):
+        return len(self.windows)
+
+    def size(self):
+        # Estimated from the size of the RGBA buffers of the figures, in bytes
+        total = 0
+        for figure in self.figures.values():
+            width, height = figure.get_size_inches() * figure.dpi
+            total += int(width * height * 4)
+        return total
+
+    def open(self, figure, parent=None):
+        import pickle
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas, NavigationToolbar2QT as NavigationToolbar
+
+        figure = pickle.loads(pickle.dumps(figure))
+
+        window = QtWidgets.QMainWindow(parent)
+        window.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        window.setWindowTitle('Graphique détaché')
+
+        frame = QtWidgets.QFrame(window)
+
+        canvas = FigureCanvas(figure)
+        canvas.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
+        canvas.updateGeometry()
+        canvas.draw()
+
+        toolbar = NavigationToolbar(canvas, frame)
+
+        layout = QtWidgets.QVBoxLayout(frame)
+        layout.addWidget(canvas, 1)
+        layout.addWidget(toolbar, 0)
+
+        window.setCentralWidget(frame)
+        window.destroyed.connect(partial(self.release, window))
+
+        self.windows.append(window)
+        self.figures[window] = figure
+        self.close_oldest(self.max_figures)
+
+        window.show()
+        self.changed.emit()
+        return window
+
+    def release(self, window):
+        # Windows are forgotten when they are closed, or when their parent is destroyed
+        if window in self.figures:
+            self.windows.remove(window)
+            self.figures.pop(window).clear()
+            self.changed.emit()
+
+    def set_max_figures(self, max_figures):
+        self.max_figures = max_figures
+        self.close_oldest(max_figures)
+
+    def close_all(self):
+        self.close_oldest(0)
+
+    def close_oldest(self, keep):
+        while len(self.windows) > keep:
+            window = self.windows[0]
+            self.release(window)
+            window.close()
+
+
+detached_plots = DetachedPlots()
+
 
 class DetachablePlotFrame(QtWidgets.QFrame):
     def __init__(self, parent):
@@ -207,83 +637,282 @@ class DetachablePlotFrame(QtWidgets.QFrame):
             self.figure.savefig(filepath, bbox_inches='tight')
 
     def detach_plot(self):
-        new_window = QtWidgets.QMainWindow(self)
-        new_window.setWindowTitle('Graphique détaché')
+        if self.figure is not None:
+            return detached_plots.open(self.figure, self)
 
-        frame = QtWidgets.QFrame(new_window)
-
-        canvas = FigureCanvas(self.figure)
-        canvas.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
-        canvas.updateGeometry()
-        canvas.draw()
-
-        toolbar = NavigationToolbar(canvas, frame)
+    def update_figure(self, figure):
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
-        layout = QtWidgets.QVBoxLayout(frame)
-        layout.addWidget(canvas, 1)
-        layout.addWidget(toolbar, 0)
+        self.figure = figure
 
-        new_window.setCentralWidget(frame)
-        new_window.show()
+        if self.canvas is None:
+            self.canvas = FigureCanvas(self.figure)
+            self.canvas.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
+            self.canvas.updateGeometry()
+            self.layout.addWidget(self.canvas, 0, 0, 2, 1)
+        else:
+            # Keep the same canvas widget, and fit the new figure to its current size
+            self.canvas.figure = self.figure
+            self.figure.set_canvas(self.canvas)
+            QtWidgets.QApplication.sendEvent(self.canvas, QtGui.QResizeEvent(self.canvas.size(), self.canvas.size()))
 
-        return new_window
+        with timings.span('dessin'):
+            self.canvas.draw()
 
-    def update_figure(self, figure):
-        self.figure = figure
+        window = self.window()
+        if isinstance(window, QtWidgets.QMainWindow):
+            window.statusBar().showMessage('Dernier rendu : ' + timings.summary())
 
+    def refresh(self):
         if self.canvas is not None:
-            self.layout.removeWidget(self.canvas)
-            self.layout.removeWidget(self.toolbar)
-            self.canvas.deleteLater()
+            self.canvas.draw_idle()
 
-        self.canvas = FigureCanvas(self.figure)
-        self.canvas.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
-        self.canvas.updateGeometry()
-        self.canvas.draw()
 
-        self.layout.addWidget(self.canvas, 0, 0, 2, 1)
+class DataFrameModel(QtCore.QAbstractTableModel):
+    # Read-only model of a dataframe. Only the displayed cells are formatted, and
+    # the dataframe is sorted by pandas rather than by comparing cells one by one
+    # (as a QSortFilterProxyModel would), so large tables stay responsive.
+    def __init__(self, parent, dataframe=None, formats=None):
+        super().__init__(parent)
+        self.formats = {} if formats is None else formats
+        self.df = None
+        self.columns = []
+        self.sort_column = None
+        self.sort_order = QtCore.Qt.AscendingOrder
+        self.set_dataframe(dataframe)
+
+    def set_dataframe(self, dataframe):
+        # The current sort order is kept
+        self.beginResetModel()
+        if dataframe is not None and self.sort_column is not None and self.sort_column < len(dataframe.columns):
+            dataframe = dataframe.sort_values(dataframe.columns[self.sort_column], kind='mergesort',
+                                              ascending=self.sort_order == QtCore.Qt.AscendingOrder,
+                                              na_position='last')
+        self.df = dataframe
+        self.columns = [] if dataframe is None else [dataframe[column].values for column in dataframe.columns]
+        self.endResetModel()
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.set_dataframe(self.df)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if self.df is None or parent.isValid() else len(self.df)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        value = self.columns[index.column()][index.row()]
+        if hasattr(value, 'item'):
+            value = value.item()
+        if value != value:
+            value = None
+
+        if role == QtCore.Qt.DisplayRole:
+            name = self.df.columns[index.column()]
+            if value is None:
+                return ''
+            return self.formats[name].format(value) if name in self.formats else str(value)
+        elif role == QtCore.Qt.UserRole:
+            return value
+        elif role == QtCore.Qt.TextAlignmentRole and isinstance(value, (int, float)):
+            return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal and self.df is not None:
+            return str(self.df.columns[section])
+        return super().headerData(section, orientation, role)
 
 
 class FrameDataFrame(QtWidgets.QFrame):
-    def __init__(self, parent, dataframe):
+    def __init__(self, parent, dataframe, state=None):
         super().__init__(parent)
-        self.df = dataframe
+        from .stats import Statistics
 
+        self.df = dataframe
+        self.stats = Statistics(self.df)
+        self.state = {} if state is None else state
+
+        # Tabs are only built the first time they are shown
+        self.frames = [
+            (FrameSkills, 'Répartition des compétences'),
+            (FrameEvolution, 'Évolution des tests'),
+            (FrameGeneral, 'Vue générale'),
+            (FrameStudents, 'Résultats individuels'),
+            (FrameProgression, 'Progression des étudiants'),
+            (FrameSummary, 'Tableau récapitulatif'),
+        ]
         self.tabs = QtWidgets.QTabWidget(self)
-        self.tabs.addTab(FrameSkills(self, self.df), 'Répartition des compétences')
-        self.tabs.addTab(FrameEvolution(self, self.df), 'Évolution des tests')
-        self.tabs.addTab(FrameGeneral(self, self.df), 'Vue générale')
-        self.tabs.addTab(FrameStudents(self, self.df), 'Résultats individuels')
-        self.tabs.setCurrentIndex(0)
+        for _, title in self.frames:
+            container = QtWidgets.QWidget(self.tabs)
+            QtWidgets.QVBoxLayout(container).setContentsMargins(0, 0, 0, 0)
+            self.tabs.addTab(container, title)
+        self.tabs.currentChanged.connect(self.build_tab)
+        self.tabs.setCurrentIndex(self.state.get('tab', 0))
+        self.build_tab(self.tabs.currentIndex())
 
         self.layout = QtWidgets.QVBoxLayout(self)
         self.layout.addWidget(self.tabs, 1)
         self.tabs.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
 
+    def build_tab(self, index):
+        if index < 0 or not isinstance(self.frames[index], tuple):
+            return
+
+        cls, _ = self.frames[index]
+        container = self.tabs.widget(index)
+        self.frames[index] = cls(container, self.df, self.stats)
+        if cls.__name__ in self.state:
+            self.frames[index].restore_state(self.state[cls.__name__])
+        container.layout().addWidget(self.frames[index])
+
+    def save_state(self):
+        # Current tab and settings of the tabs, including the ones restored but not built yet
+        state = dict(self.state, tab=self.tabs.currentIndex())
+        for frame in self.frames:
+            if not isinstance(frame, tuple):
+                state[type(frame).__name__] = frame.save_state()
+        return state
+
 
-class FrameEvolution(QtWidgets.QFrame):
-    def __init__(self, parent, dataframe):
+class LazyFrame(QtWidgets.QFrame):
+    # Frame of an analysis tab, showing a figure or a table. Updates requested
+    # while the frame is hidden are deferred until it is shown.
+    ALL_SKILLS = 'Toutes les compétences'
+
+    # Optional artists of the figure (see plotting.set_visible), each toggled by
+    # the checkbox of the same attribute name
+    ARTISTS = []
+
+    def __init__(self, parent):
         super().__init__(parent)
-        self.df = dataframe
+        self.outdated = False
 
-        self.plot = DetachablePlotFrame(self)
+    def add_skills(self, extra=[]):
+        # Group box of radio buttons to choose a skill (see selected_skill), after
+        # the given extra choices. The first choice is checked.
         self.skillsbox = QtWidgets.QGroupBox('Compétences', self)
-
         self.skills = QtWidgets.QButtonGroup(self.skillsbox)
-        self.skills.buttonClicked.connect(self.update_figure)
-
-        self.skills.addButton(QtWidgets.QRadioButton('Toutes les compétences', self.skillsbox))
-        for skill in self.df['skill'].drop_duplicates().sort_values().values:
-            self.skills.addButton(QtWidgets.QRadioButton(skill, self.skillsbox))
+        self.skills.buttonClicked.connect(self.request_update)
+
+        layout = QtWidgets.QHBoxLayout(self.skillsbox)
+        for text in [self.ALL_SKILLS] + list(extra) + list(self.df['skill'].drop_duplicates().sort_values().values):
+            radio = QtWidgets.QRadioButton(text, self.skillsbox)
+            self.skills.addButton(radio)
+            layout.addWidget(radio, 0)
+        layout.addStretch(1)
         self.skills.buttons()[0].setChecked(True)
+        return self.skillsbox
+
+    def selected_skill(self):
+        # Checked skill, or None for all of them
+        skill = self.skills.checkedButton().text()
+        return None if skill == self.ALL_SKILLS else skill
+
+    def add_search(self, parent, searched):
+        # Field to search a student. searched is called once typing pauses, not on every keypress.
+        self.search = QtWidgets.QLineEdit(parent)
+        self.search.setPlaceholderText('Rechercher un étudiant')
+        self.search.setClearButtonEnabled(True)
+
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(searched)
+        self.search.textChanged.connect(self.search_timer.start)
+        return self.search
+
+    def set_artists(self, figure):
+        from . import plotting
+
+        for name in self.ARTISTS:
+            plotting.set_visible(figure, name, getattr(self, name).isChecked())
+
+    def update_artists(self):
+        # Toggle the optional parts of the current figure instead of building a new one
+        if self.plot.figure is not None:
+            self.set_artists(self.plot.figure)
+            self.plot.refresh()
+
+    def request_update(self, *args):
+        if self.isVisible():
+            self.outdated = False
+            timings.reset()
+            self.update_view()
+        else:
+            self.outdated = True
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.outdated:
+            self.outdated = False
+            timings.reset()
+            self.update_view()
+
+    def update_view(self):
+        raise NotImplementedError()
+
+    def save_state(self):
+        # Checked buttons and selected items of the frame, by attribute name
+        state = {}
+        for name, widget in vars(self).items():
+            if isinstance(widget, QtWidgets.QButtonGroup) and widget.checkedButton() is not None:
+                state[name] = widget.checkedButton().text()
+            elif isinstance(widget, QtWidgets.QCheckBox):
+                state[name] = widget.isChecked()
+            elif isinstance(widget, QtWidgets.QComboBox):
+                state[name] = widget.currentText()
+            elif isinstance(widget, QtWidgets.QLineEdit):
+                state[name] = widget.text()
+            elif isinstance(widget, QtWidgets.QAbstractItemView) and widget.currentIndex().isValid():
+                state[name] = widget.currentIndex().data()
+        return state
+
+    def restore_state(self, state):
+        for name, value in state.items():
+            widget = getattr(self, name, None)
+            if isinstance(widget, QtWidgets.QButtonGroup):
+                for button in widget.buttons():
+                    if button.text() == value:
+                        button.setChecked(True)
+            elif isinstance(widget, QtWidgets.QCheckBox):
+                widget.setChecked(value)
+            elif isinstance(widget, QtWidgets.QComboBox) and widget.findText(value) >= 0:
+                widget.setCurrentIndex(widget.findText(value))
+            elif isinstance(widget, QtWidgets.QLineEdit):
+                widget.setText(value)
+            elif isinstance(widget, QtWidgets.QAbstractItemView):
+                model = widget.model()
+                matches = model.match(model.index(0, 0), QtCore.Qt.DisplayRole, value, 1, QtCore.Qt.MatchExactly)
+                if matches:
+                    widget.setCurrentIndex(matches[0])
+
+
+class FrameEvolution(LazyFrame):
+    SIDE_BY_SIDE = 'Toutes les compétences côte à côte'
+    ARTISTS = ['quartiles', 'tests']
+
+    def __init__(self, parent, dataframe, stats):
+        super().__init__(parent)
+        self.df = dataframe
+        self.stats = stats
+
+        self.plot = DetachablePlotFrame(self)
+        self.add_skills([self.SIDE_BY_SIDE])
 
         self.settings = QtWidgets.QGroupBox('Paramètres', self)
         self.quartiles = QtWidgets.QCheckBox('Quartiles', self.settings)
         self.quartiles.setChecked(True)
-        self.quartiles.stateChanged.connect(self.update_figure)
+        self.quartiles.stateChanged.connect(self.update_artists)
         self.tests = QtWidgets.QCheckBox('Code des tests', self.settings)
         self.tests.setChecked(True)
-        self.tests.stateChanged.connect(self.update_figure)
+        self.tests.stateChanged.connect(self.update_artists)
 
         # Layout
         self.layout = QtWidgets.QVBoxLayout(self)
@@ -296,24 +925,27 @@ class FrameEvolution(QtWidgets.QFrame):
 
         self.layout.addWidget(self.skillsbox, 0)
 
-        groupbox_layout = QtWidgets.QHBoxLayout(self.skillsbox)
-        for radio in self.skills.buttons():
-            groupbox_layout.addWidget(radio, 0)
-        groupbox_layout.addStretch(1)
+        self.request_update()
 
-        self.update_figure()
+    def update_view(self):
+        from . import plotting
 
-    def update_figure(self):
-        skill = self.skills.checkedButton().text()
-        skill = None if skill == 'Toutes les compétences' else skill
-        figure = plotting.tests_results_evolution(self.df, skill, display_tests=self.tests.isChecked(), display_quartiles=self.quartiles.isChecked())
+        if self.skills.checkedButton().text() == self.SIDE_BY_SIDE:
+            figure = plotting.skills_evolution(self.df, display_tests=True, display_quartiles=True, stats=self.stats)
+        else:
+            figure = plotting.tests_results_evolution(self.df, self.selected_skill(), display_tests=True,
+                                                      display_quartiles=True, stats=self.stats)
+        self.set_artists(figure)
         self.plot.update_figure(figure)
 
 
-class FrameGeneral(QtWidgets.QFrame):
-    def __init__(self, parent, dataframe):
+class FrameGeneral(LazyFrame):
+    GROUPS_PER_PAGE = 30
+
+    def __init__(self, parent, dataframe, stats):
         super().__init__(parent)
         self.df = dataframe
+        self.stats = stats
 
         self.plot = DetachablePlotFrame(self)
         self.settingbox = QtWidgets.QGroupBox('Paramètres', self)
@@ -322,24 +954,28 @@ class FrameGeneral(QtWidgets.QFrame):
         self.radiogroup.addButton(QtWidgets.QRadioButton('Grouper par étudiant', self.settingbox))
         self.radiogroup.addButton(QtWidgets.QRadioButton('Grouper par test', self.settingbox))
         self.radiogroup.buttons()[0].setChecked(True)
-        self.radiogroup.buttonClicked.connect(self.update_figure)
+        self.radiogroup.buttonClicked.connect(self.request_update)
 
         self.normalized = QtWidgets.QCheckBox('Normaliser', self.settingbox)
-        self.normalized.stateChanged.connect(self.update_figure)
+        self.normalized.stateChanged.connect(self.request_update)
+        self.by_median = QtWidgets.QCheckBox('Trier par médiane', self.settingbox)
+        self.by_median.stateChanged.connect(self.request_update)
 
-        self.skillsbox = QtWidgets.QGroupBox('Compétences', self)
-        self.skills = QtWidgets.QButtonGroup(self.skillsbox)
-        self.skills.buttonClicked.connect(self.update_figure)
+        # Only GROUPS_PER_PAGE groups are drawn at once, the others are reached by scrolling
+        self.scrollbar = QtWidgets.QScrollBar(QtCore.Qt.Vertical, self)
+        self.scrollbar.setTracking(False)
+        self.scrollbar.setPageStep(self.GROUPS_PER_PAGE)
+        self.scrollbar.setSingleStep(self.GROUPS_PER_PAGE // 2)
+        self.scrollbar.valueChanged.connect(self.request_update)
 
-        radio = QtWidgets.QRadioButton('Toutes les compétences', self.skillsbox)
-        radio.setChecked(True)
-        self.skills.addButton(radio)
-        for skill in self.df['skill'].drop_duplicates().sort_values().values:
-            self.skills.addButton(QtWidgets.QRadioButton(skill, self.skillsbox))
+        self.add_skills()
 
         # Layout
         self.layout = QtWidgets.QVBoxLayout(self)
-        self.layout.addWidget(self.plot, 1)
+        plot_layout = QtWidgets.QHBoxLayout()
+        plot_layout.addWidget(self.plot, 1)
+        plot_layout.addWidget(self.scrollbar, 0)
+        self.layout.addLayout(plot_layout, 1)
         self.layout.addWidget(self.settingbox, 0)
 
         groupbox_layout = QtWidgets.QVBoxLayout(self.settingbox)
@@ -349,30 +985,39 @@ class FrameGeneral(QtWidgets.QFrame):
         radio_layout.addStretch(1)
         groupbox_layout.addLayout(radio_layout)
         groupbox_layout.addWidget(self.normalized, 0)
+        groupbox_layout.addWidget(self.by_median, 0)
 
         self.layout.addWidget(self.skillsbox, 0)
 
-        groupbox_layout = QtWidgets.QHBoxLayout(self.skillsbox)
-        for radio in self.skills.buttons():
-            groupbox_layout.addWidget(radio, 0)
-        groupbox_layout.addStretch(1)
+        self.request_update()
 
-        self.update_figure()
+    def update_view(self):
+        from . import plotting
 
-    def update_figure(self):
         normalized = self.normalized.isChecked()
         group_by = 'name' if self.radiogroup.checkedButton().text() == 'Grouper par étudiant' else 'code'
 
-        skill = self.skills.checkedButton().text()
-        skill = None if skill == 'Toutes les compétences' else skill
-        figure = plotting.results_overview(self.df, normalized=normalized, group_by=group_by, skill=skill)
+        by_median = self.by_median.isChecked()
+        skill = self.selected_skill()
+
+        total = len(plotting.overview_boxes(self.df, normalized, group_by, skill, by_median, stats=self.stats))
+        self.scrollbar.blockSignals(True)
+        self.scrollbar.setMaximum(max(0, total - self.GROUPS_PER_PAGE))
+        self.scrollbar.blockSignals(False)
+        paginated = total > self.GROUPS_PER_PAGE
+        self.scrollbar.setVisible(paginated)
+
+        figure = plotting.results_overview(self.df, normalized=normalized, group_by=group_by, skill=skill,
+                                           by_median=by_median, start=self.scrollbar.value() if paginated else 0,
+                                           count=self.GROUPS_PER_PAGE if paginated else None, stats=self.stats)
         self.plot.update_figure(figure)
 
 
-class FrameSkills(QtWidgets.QFrame):
-    def __init__(self, parent, dataframe):
+class FrameSkills(LazyFrame):
+    def __init__(self, parent, dataframe, stats):
         super().__init__(parent)
         self.df = dataframe
+        self.stats = stats
 
         self.plot = DetachablePlotFrame(self)
         self.settingbox = QtWidgets.QGroupBox('Paramètres', self)
@@ -381,7 +1026,7 @@ class FrameSkills(QtWidgets.QFrame):
         self.radiogroup.addButton(QtWidgets.QRadioButton('En nombre', self.settingbox))
         self.radiogroup.addButton(QtWidgets.QRadioButton('En poids', self.settingbox))
         self.radiogroup.buttons()[0].setChecked(True)
-        self.radiogroup.buttonClicked.connect(self.update_figure)
+        self.radiogroup.buttonClicked.connect(self.request_update)
 
         # Layout
         self.layout = QtWidgets.QVBoxLayout(self)
@@ -395,48 +1040,63 @@ class FrameSkills(QtWidgets.QFrame):
         radio_layout.addStretch(1)
         groupbox_layout.addLayout(radio_layout)
 
-        self.update_figure()
+        self.request_update()
+
+    def update_view(self):
+        from . import plotting
 
-    def update_figure(self):
         by_number = self.radiogroup.checkedButton().text() == 'En nombre'
-        self.plot.update_figure(plotting.skills_distribution(self.df, by_number))
+        self.plot.update_figure(plotting.skills_distribution(self.df, by_number, stats=self.stats))
+
 
+class FrameStudents(LazyFrame):
+    ARTISTS = ['regression', 'tests']
 
-class FrameStudents(QtWidgets.QFrame):
-    def __init__(self, parent, dataframe):
+    def __init__(self, parent, dataframe, stats):
         super().__init__(parent)
         self.df = dataframe
+        self.stats = stats
         self.canvas = None
 
+        # Figures of the neighbours of the current student are built in the background
+        self.prefetching = None
+        self.prefetch_pending = None
+
         self.plot = DetachablePlotFrame(self)
         self.studentsbox = QtWidgets.QGroupBox('Étudiants', self)
         self.settingsbox = QtWidgets.QGroupBox('Paramètres', self)
-        self.skillsbox = QtWidgets.QGroupBox('Compétences', self)
 
-        self.studentslist = QtWidgets.QComboBox(self.studentsbox)
-        self.studentslist.addItems(self.df['name'].drop_duplicates().sort_values().values)
-        self.studentslist.currentIndexChanged.connect(self.update_figure)
+        self.students = QtCore.QStringListModel(list(self.df['name'].drop_duplicates().sort_values().values), self)
+        self.students_filter = QtCore.QSortFilterProxyModel(self)
+        self.students_filter.setSourceModel(self.students)
+        self.students_filter.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+
+        self.add_search(self.studentsbox, lambda: self.students_filter.setFilterFixedString(self.search.text()))
+
+        self.student = self.students_filter.index(0, 0).data() or ''
+        self.studentslist = QtWidgets.QListView(self.studentsbox)
+        self.studentslist.setModel(self.students_filter)
+        self.studentslist.setUniformItemSizes(True)
+        self.studentslist.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.studentslist.setMaximumHeight(150)
+        self.studentslist.setCurrentIndex(self.students_filter.index(0, 0))
+        self.studentslist.selectionModel().currentChanged.connect(self.student_changed)
+        self.search.returnPressed.connect(self.studentslist.setFocus)
 
         self.normalize = QtWidgets.QCheckBox('Normaliser', self.settingsbox)
-        self.normalize.stateChanged.connect(self.update_figure)
+        self.normalize.stateChanged.connect(self.request_update)
         self.regression = QtWidgets.QCheckBox('Régression', self.settingsbox)
         self.regression.setChecked(True)
-        self.regression.stateChanged.connect(self.update_figure)
+        self.regression.stateChanged.connect(self.update_artists)
         self.tests = QtWidgets.QCheckBox('Code des tests', self.settingsbox)
         self.tests.setChecked(True)
-        self.tests.stateChanged.connect(self.update_figure)
+        self.tests.stateChanged.connect(self.update_artists)
 
-        self.skills = QtWidgets.QButtonGroup(self.skillsbox)
-        self.skills.buttonClicked.connect(self.update_figure)
-
-        radio = QtWidgets.QRadioButton('Toutes les compétences', self.skillsbox)
-        radio.setChecked(True)
-        self.skills.addButton(radio)
-        for skill in self.df['skill'].drop_duplicates().sort_values().values:
-            self.skills.addButton(QtWidgets.QRadioButton(skill, self.skillsbox))
+        self.add_skills()
 
         # Students layout
-        student_layout = QtWidgets.QHBoxLayout(self.studentsbox)
+        student_layout = QtWidgets.QVBoxLayout(self.studentsbox)
+        student_layout.addWidget(self.search)
         student_layout.addWidget(self.studentslist)
 
         # Settings layout
@@ -445,12 +1105,6 @@ class FrameStudents(QtWidgets.QFrame):
         settings_layout.addWidget(self.regression)
         settings_layout.addWidget(self.tests)
 
-        # Skills layout
-        skills_layout = QtWidgets.QHBoxLayout(self.skillsbox)
-        for radio in self.skills.buttons():
-            skills_layout.addWidget(radio, 0)
-        skills_layout.addStretch(1)
-
         # General layout
         self.layout = QtWidgets.QVBoxLayout(self)
         self.layout.addWidget(self.plot, 1)
@@ -460,19 +1114,180 @@ class FrameStudents(QtWidgets.QFrame):
         self.layout.addLayout(sublayout)
         self.layout.addWidget(self.skillsbox)
 
-        self.update_figure()
+        self.request_update()
 
-    def update_figure(self, *args):
-        skill = self.skills.checkedButton().text()
-        skill = None if skill == 'Toutes les compétences' else skill
-        figure = plotting.student_results(self.df,
-                                          student=self.studentslist.currentText(),
-                                          normalized=self.normalize.checkState(),
-                                          regression=self.regression.checkState(),
-                                          display_tests=self.tests.checkState(),
-                                          skill=skill)
+    def update_view(self):
+        from . import plotting
 
+        skill = self.selected_skill()
+        figure = plotting.student_results(self.df,
+                                          student=self.student,
+                                          normalized=self.normalize.isChecked(),
+                                          regression=True,
+                                          display_tests=True,
+                                          skill=skill,
+                                          stats=self.stats)
+
+        self.set_artists(figure)
         self.plot.update_figure(figure)
+        self.prefetch_neighbours(self.normalize.isChecked(), skill)
+
+    def student_changed(self, current, previous):
+        # Students hidden by the filter keep their figure displayed
+        if current.isValid():
+            self.student = current.data()
+            self.request_update()
+
+    def prefetch_neighbours(self, normalized, skill):
+        row = self.studentslist.currentIndex().row()
+        students = [self.students_filter.index(r, 0).data() for r in (row + 1, row - 1)
+                    if row >= 0 and 0 <= r < self.students_filter.rowCount()]
+
+        # Only the last request is kept while a prefetching is running
+        self.prefetch_pending = (students, normalized, skill)
+        if self.prefetching is None or not self.prefetching.isRunning():
+            self.prefetch_finished()
+
+    def prefetch(self, students, normalized, skill):
+        from . import plotting
+
+        # Figures are kept by plotting.figure_cache. Their timings are not the ones of
+        # the displayed figure.
+        with recorded_in(Timings()):
+            for student in students:
+                plotting.student_results(self.df, student=student, normalized=normalized, regression=True,
+                                         display_tests=True, skill=skill, stats=self.stats)
+
+    def prefetch_finished(self):
+        if self.prefetch_pending is not None:
+            self.prefetching = GenericThread(self.prefetch, *self.prefetch_pending)
+            self.prefetch_pending = None
+            self.prefetching.taskFinished.connect(self.prefetch_finished)
+            self.prefetching.start()
+
+
+class FrameProgression(LazyFrame):
+    # Students sorted by the slope of their results over time (see Statistics.trends),
+    # declining students first.
+    DAYS = 30
+
+    def __init__(self, parent, dataframe, stats):
+        super().__init__(parent)
+        self.df = dataframe
+        self.stats = stats
+
+        self.model = DataFrameModel(self, formats={
+            'Moyenne': '{:.2f}',
+            'Progression (par mois)': '{:+.2f}',
+            'Minimum (IC 95 %)': '{:+.2f}',
+            'Maximum (IC 95 %)': '{:+.2f}',
+        })
+
+        self.table = QtWidgets.QTableView(self)
+        self.table.setModel(self.model)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(3, QtCore.Qt.AscendingOrder)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setStretchLastSection(True)
+
+        self.settingsbox = QtWidgets.QGroupBox('Paramètres', self)
+        self.normalize = QtWidgets.QCheckBox('Normaliser', self.settingsbox)
+        self.normalize.stateChanged.connect(self.request_update)
+
+        self.add_skills()
+
+        # Layout
+        self.layout = QtWidgets.QVBoxLayout(self)
+        self.layout.addWidget(self.table, 1)
+        self.layout.addWidget(self.settingsbox, 0)
+        settings_layout = QtWidgets.QVBoxLayout(self.settingsbox)
+        settings_layout.addWidget(self.normalize)
+        self.layout.addWidget(self.skillsbox, 0)
+
+        self.request_update()
+
+    def update_view(self):
+        import numpy
+
+        field = 'normalized_result' if self.normalize.isChecked() else 'weighted_result'
+        trends = self.stats.trends(field, self.selected_skill())
+
+        # Slopes are given per day, and are only significant if their interval excludes 0
+        tendency = numpy.select([trends['slope_high'] < 0, trends['slope_low'] > 0], ['en baisse', 'en hausse'],
+                                'stable')
+        table = trends.reset_index()
+        table = table.assign(tendency=numpy.where(table['slope'].isnull(), '', tendency))
+        table = table[['name', 'count', 'mean', 'slope', 'slope_low', 'slope_high', 'tendency']]
+        for column in ['slope', 'slope_low', 'slope_high']:
+            table[column] = table[column] * self.DAYS
+        table.columns = ['Étudiant', 'Résultats', 'Moyenne', 'Progression (par mois)', 'Minimum (IC 95 %)',
+                         'Maximum (IC 95 %)', 'Tendance']
+
+        self.model.set_dataframe(table)
+        self.table.resizeColumnsToContents()
+
+
+class FrameSummary(LazyFrame):
+    # Mean results of each student for each skill (see Statistics.summary), that
+    # can be filtered by student and by skill.
+    def __init__(self, parent, dataframe, stats):
+        super().__init__(parent)
+        self.df = dataframe
+        self.stats = stats
+
+        self.model = DataFrameModel(self, formats={
+            'Moyenne (bruts)': '{:.2f}',
+            'Moyenne (normalisés)': '{:+.2f}',
+            'Rang centile': '{:.0f}',
+        })
+
+        self.table = QtWidgets.QTableView(self)
+        self.table.setModel(self.model)
+        self.table.setSortingEnabled(True)
+        self.table.sortByColumn(0, QtCore.Qt.AscendingOrder)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.setWordWrap(False)
+        self.table.verticalHeader().setVisible(False)
+        # Rows of a fixed height do not have to be measured
+        self.table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.table.horizontalHeader().setStretchLastSection(True)
+
+        self.add_search(self, self.request_update)
+        self.count = QtWidgets.QLabel(self)
+        self.add_skills()
+
+        # Layout
+        self.layout = QtWidgets.QVBoxLayout(self)
+        search_layout = QtWidgets.QHBoxLayout()
+        search_layout.addWidget(self.search, 1)
+        search_layout.addWidget(self.count, 0)
+        self.layout.addLayout(search_layout)
+        self.layout.addWidget(self.table, 1)
+        self.layout.addWidget(self.skillsbox, 0)
+
+        self.request_update()
+
+    def update_view(self):
+        summary = self.stats.summary.reset_index()
+
+        skill = self.selected_skill()
+        if skill is not None:
+            summary = summary[summary['skill'] == skill]
+        if self.search.text():
+            summary = summary[summary['name'].str.contains(self.search.text(), case=False, regex=False)]
+
+        summary = summary[['name', 'skill', 'tests', 'missing', 'weighted_result', 'normalized_result', 'rank']]
+        summary.columns = ['Étudiant', 'Compétence', 'Tests', 'Tests manquants', 'Moyenne (bruts)',
+                           'Moyenne (normalisés)', 'Rang centile']
+
+        resize = self.model.df is None
+        self.model.set_dataframe(summary)
+        if resize:
+            self.table.resizeColumnsToContents()
+        self.count.setText('{} lignes'.format(len(summary)))
 
 
 def main(argv):
@@ -481,8 +1296,23 @@ def main(argv):
     app.setOrganizationName('decan')
     app.setOrganizationDomain('decan.lexpage.net')
 
+    # Profile the whole session, e.g. PYTBUL_PROFILE=pytbul.prof
+    profile_path = os.environ.get('PYTBUL_PROFILE')
+    if profile_path:
+        profiler.start()
+
     window = MainWindow()
     window.setWindowTitle('pytbul')
     window.resize(1000, 800)
     window.show()
+
+    # Import the heavy modules while the user chooses a file
+    preloading = GenericThread(preload_modules)
+    QtCore.QTimer.singleShot(0, preloading.start)
     app.exec_()
+
+    for thread in list(GenericThread.instances):
+        thread.wait()
+
+    if profiler.active:
+        profiler.stop(profile_path or 'pytbul.prof')
@@ -1,8 +1,30 @@
-import pandas
-import pyexcel_xls
+import concurrent.futures
 import datetime
+import multiprocessing
+import os
+
+import numpy
+import pandas
 
+from functools import partial
 from itertools import takewhile
+from .readers import open_workbook
+from .stats import describe, loaded_tests
+from .timing import span
+
+
+RESULTS_COLUMNS = ['name', 'period', 'date', 'code', 'test', 'weight', 'skill', 'result']
+TESTS_STATISTICS = ['mean', '25%', '50%', '75%']
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+def school_year_dates(year):
+    # Start of the periods of the school year beginning in September of given year,
+    # as expected by tests_dates (the default tests_dates are those of 2015)
+    return [(year, 9), (year, 11), (year + 1, 2), (year + 1, 4), (year + 1, 6)]
 
 
 def load_from_xls(filepath, *,
@@ -14,70 +36,330 @@ def load_from_xls(filepath, *,
                   test_pos=(0, 2),
                   max_decal=1,
                   comp_decal=2,
-                  norm_weight=20):
-    results = []
+                  norm_weight=20,
+                  cache=None,
+                  progress=None,
+                  compact=False):
+    if cache is not None:
+        key = cache.key(filepath, names_sheet, tests_sheets, tests_dates, tests_stopwords, name_pos, test_pos,
+                        max_decal, comp_decal, norm_weight, compact)
+        with span('cache'):
+            df = cache.get(key)
+        if df is not None:
+            return df
+
+    df = read_results(filepath, names_sheet=names_sheet, tests_sheets=tests_sheets, tests_dates=tests_dates,
+                      tests_stopwords=tests_stopwords, name_pos=name_pos, test_pos=test_pos,
+                      max_decal=max_decal, comp_decal=comp_decal, norm_weight=norm_weight,
+                      progress=progress)
+    with span('quartiles'):
+        ndf = normalize_results(df, compact=compact)
+
+    if cache is not None:
+        with span('cache'):
+            cache.put(key, ndf)
+
+    return ndf
+
+
+def read_fingerprints(filepath, *, names_sheet='Nom', tests_sheets=['B1', 'B2', 'B3', 'B4']):
+    # Fingerprint of each sheet, to detect which ones changed (None for missing sheets)
+    fingerprints = {}
+    with open_workbook(filepath) as reader:
+        for sheet in [names_sheet] + list(tests_sheets):
+            try:
+                fingerprints[sheet] = reader.fingerprint(sheet)
+            except KeyError:
+                fingerprints[sheet] = None
+    return fingerprints
+
+
+def reload_from_xls(filepath, df, fingerprints, *,
+                    names_sheet='Nom',
+                    tests_sheets=['B1', 'B2', 'B3', 'B4'],
+                    tests_dates=[(2015, 9), (2015, 11), (2016, 2), (2016, 4), (2016, 6)],
+                    tests_stopwords=['', 'Total SSFL'],
+                    name_pos=(3, 1),
+                    test_pos=(0, 2),
+                    max_decal=1,
+                    comp_decal=2,
+                    norm_weight=20,
+                    cache=None,
+                    progress=None,
+                    compact=False):
+    # Update a frame previously loaded from filepath, given the fingerprints of its
+    # sheets (see read_fingerprints). Only the sheets that changed are read again,
+    # and statistics are only computed again for the dates of their tests.
+    # Return the new frame, the new fingerprints and the list of changed sheets.
+    options = dict(names_sheet=names_sheet, tests_sheets=tests_sheets, tests_dates=tests_dates,
+                   tests_stopwords=tests_stopwords, name_pos=name_pos, test_pos=test_pos, max_decal=max_decal,
+                   comp_decal=comp_decal, norm_weight=norm_weight)
+
+    new_fingerprints = read_fingerprints(filepath, names_sheet=names_sheet, tests_sheets=tests_sheets)
+    changed = [sheet for sheet in tests_sheets if new_fingerprints[sheet] != fingerprints.get(sheet)]
+
+    if new_fingerprints[names_sheet] != fingerprints.get(names_sheet):
+        # Students changed, every sheet has to be read again
+        ndf = load_from_xls(filepath, cache=cache, progress=progress, compact=compact, **options)
+        return ndf, new_fingerprints, list(tests_sheets)
+    elif not changed:
+        return df, new_fingerprints, []
+
+    with open_workbook(filepath) as reader:
+        students = read_students(reader, names_sheet, name_pos)
+
+        blocks = []
+        for sheet_i, sheet in enumerate(changed):
+            if progress is not None:
+                progress(sheet_i, len(changed), sum(len(block) for block in blocks))
+
+            position = tests_sheets.index(sheet)
+            block = read_sheet(reader, sheet, tests_dates[position], tests_dates[position + 1], students,
+                               tests_stopwords=tests_stopwords, name_pos=name_pos, test_pos=test_pos,
+                               max_decal=max_decal, comp_decal=comp_decal)
+            if block is not None:
+                blocks.append(block)
+
+        if progress is not None:
+            progress(len(changed), len(changed), sum(len(block) for block in blocks))
+
+    with span('mise en forme'):
+        # Results of unchanged sheets are kept, in the order of a full loading. The
+        # results of a student in a sheet come from a single frame, in which they
+        # already are in the order of the tests: they keep their relative position.
+        kept = df.loc[~df['period'].isin(changed), RESULTS_COLUMNS + ['weighted_result']]
+        raw = pandas.concat([concat_results(blocks, norm_weight), kept], ignore_index=True)
+
+        sheet_order = {sheet: i for i, sheet in enumerate(tests_sheets)}
+        student_order = {student: i for i, student in enumerate(students)}
+        order = numpy.lexsort([numpy.arange(len(raw)),
+                               raw['name'].astype(object).map(student_order).values,
+                               raw['period'].astype(object).map(sheet_order).values])
+        raw = raw.iloc[order].reset_index(drop=True)
+
+    # Statistics are only computed for the dates of the changed sheets, the other
+    # ones are those kept with the frame (or, for older frames, in its columns)
+    dates = pandas.concat([df.loc[df['period'].isin(changed), 'date']] + [block['date'] for block in blocks]).unique()
+    affected = raw['date'].isin(dates)
+    with span('quartiles'):
+        previous = loaded_tests(df)
+        if previous is None and set(TESTS_STATISTICS).issubset(df.columns):
+            previous = df[['date'] + TESTS_STATISTICS].drop_duplicates('date').set_index('date').dropna(how='all')
+
+        if previous is not None and list(previous.index.names) == ['date']:
+            previous = previous[~previous.index.isin(dates)]
+            tests = pandas.concat([previous, tests_statistics(raw[affected], ['date'])]).sort_index()
+        else:
+            tests = tests_statistics(raw, ['date'])
+
+        ndf = normalize_results(raw, compact=compact, tests=tests)
+
+    if cache is not None:
+        with span('cache'):
+            cache.put(cache.key(filepath, names_sheet, tests_sheets, tests_dates, tests_stopwords, name_pos, test_pos,
+                                max_decal, comp_decal, norm_weight, compact), ndf)
+
+    return ndf, new_fingerprints, changed
+
+
+def class_names(paths):
+    # Classes are named after their file, without its extension: files of the
+    # same name (e.g. in different directories) would be mixed up
+    names = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    for name in names:
+        if names.count(name) > 1:
+            raise ValueError('Several files are named %s' % name)
+    return names
+
+
+def load_many(paths, *, scope='class', max_workers=None, compact=False, **options):
+    # Workbooks are parsed in parallel, one per process. Quartiles and normalized
+    # results are then computed either per class (scope='class') or over all the
+    # workbooks at once (scope='global').
+    if scope not in ('class', 'global'):
+        raise ValueError('Unknown scope: %s' % scope)
+
+    paths = list(paths)
+    classes = class_names(paths)
 
-    data = pyexcel_xls.get_data(filepath)
+    # Workers are spawned rather than forked, as the caller may run threads (e.g. Qt)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers,
+                                                mp_context=multiprocessing.get_context('spawn')) as executor:
+        frames = list(executor.map(partial(read_results, **options), paths))
 
+    for path, class_name, df in zip(paths, classes, frames):
+        df['class'] = class_name
+        df['source'] = path
+        # Codes and periods are only unique within a class: they are prefixed by the class
+        if len(paths) > 1:
+            for column in ['period', 'code']:
+                df[column] = df['class'] + '/' + df[column]
+
+    df = pandas.concat(frames, ignore_index=True)
+    return normalize_results(df, by=['class'] if scope == 'class' else [], compact=compact)
+
+
+def read_results(filepath, *,
+                 names_sheet='Nom',
+                 tests_sheets=['B1', 'B2', 'B3', 'B4'],
+                 tests_dates=[(2015, 9), (2015, 11), (2016, 2), (2016, 4), (2016, 6)],
+                 tests_stopwords=['', 'Total SSFL'],
+                 name_pos=(3, 1),
+                 test_pos=(0, 2),
+                 max_decal=1,
+                 comp_decal=2,
+                 norm_weight=20,
+                 progress=None):
+    # If given, progress(sheets_done, sheets_total, rows) is called as sheets are read;
+    # it may raise LoadCancelled to abort the loading.
+    with open_workbook(filepath) as reader:
+        students = read_students(reader, names_sheet, name_pos)
+
+        blocks = []
+        rows_built = 0
+
+        for sheet_i, sheet in enumerate(tests_sheets):
+            if progress is not None:
+                progress(sheet_i, len(tests_sheets), rows_built)
+
+            block = read_sheet(reader, sheet, tests_dates[sheet_i], tests_dates[sheet_i + 1], students,
+                               tests_stopwords=tests_stopwords, name_pos=name_pos, test_pos=test_pos,
+                               max_decal=max_decal, comp_decal=comp_decal)
+            if block is not None:
+                blocks.append(block)
+                rows_built += len(block)
+
+        if progress is not None:
+            progress(len(tests_sheets), len(tests_sheets), rows_built)
+
+    return concat_results(blocks, norm_weight)
+
+
+def read_students(reader, names_sheet, name_pos):
     students = []
-    for line in data[names_sheet][name_pos[0]:]:
-        try:
-            name = line[name_pos[1]]
-            if name:
-                students.append(name)
-        except IndexError as e:
-            pass
-
-    for sheet in tests_sheets:
-        _ = data[sheet][test_pos[0]][test_pos[1]:]
-        tests = list(takewhile(lambda s: s not in tests_stopwords, _))
-        maxs = data[sheet][test_pos[0] + max_decal][test_pos[1]:test_pos[1] + len(tests)]
-        comps = data[sheet][test_pos[0] + comp_decal][test_pos[1]:test_pos[1] + len(tests)]
-        for student_i, student in enumerate(students):
-            if len(tests) == 0:
-                continue
-
-            year, month = tests_dates[tests_sheets.index(sheet)]
-            tests_start = datetime.datetime(year=year, month=month, day=1)
-
-            year, month = tests_dates[tests_sheets.index(sheet) + 1]
-            tests_end = datetime.datetime(year=year, month=month, day=1)
-
-            tests_interval = (tests_end - tests_start).days // len(tests)
-
-            for test_i, test in enumerate(tests):
-                row = name_pos[0] + student_i
-                column = test_pos[1] + test_i
-                value = data[sheet][row][column]
-
-                if value != 0 and not value:
-                    value = pandas.np.nan
-
-                test_date = tests_start + datetime.timedelta(days=test_i * tests_interval)
-
-                result = {
-                    'name': student,
-                    'period': sheet,
-                    'date': test_date,
-                    'code': '%s/%02d/%s' % (sheet, test_i + 1, comps[test_i]),
-                    'test': '%s' % test,
-                    'weight': maxs[test_i],
-                    'skill': comps[test_i],
-                    'result': value
-                }
-
-                results.append(result)
-
-    df = pandas.DataFrame.from_dict(results)
-    df['weighted_result'] = df['result'] / df['weight'] * norm_weight
-
-    tests = df.dropna().groupby('date')['result'].describe().unstack()[['mean', '25%', '50%', '75%']]
-    ndf = df.merge(tests, how='outer', left_on=['date'], right_index=True)
-    ndf['range'] = (ndf['75%'] - ndf['25%'])
-    ndf['normalized_result'] = (ndf['result'] - ndf['50%']) / ndf['range']
+    for line in reader.rows(names_sheet, start_row=name_pos[0], start_column=name_pos[1],
+                            stop_column=name_pos[1] + 1):
+        if line and line[0]:
+            students.append(line[0])
+    return students
+
+
+def read_sheet(reader, sheet, start_date, end_date, students, *, tests_stopwords, name_pos, test_pos, max_decal,
+               comp_decal):
+    # Results of given students for the tests of a sheet, or None if there is none.
+    # The rows of the tests and of the students are read at once, as some readers
+    # (e.g. for .ods files) go through the file again for each request. Readers
+    # with random access read the tests first, so that only their columns are read.
+    stop_column = None
+    if reader.random_access:
+        header = reader.row(sheet, test_pos[0], start_column=test_pos[1])
+        stop_column = test_pos[1] + len(list(takewhile(lambda s: s not in tests_stopwords, header)))
+
+    first = min(test_pos[0], name_pos[0])
+    lines = reader.rows(sheet, first, name_pos[0] + len(students), test_pos[1], stop_column)
+
+    def line(row, length=None):
+        cells = lines[row - first] if 0 <= row - first < len(lines) else []
+        cells = list(cells if length is None else cells[:length])
+        while cells and cells[-1] == '':
+            cells.pop()
+        return cells
+
+    tests = list(takewhile(lambda s: s not in tests_stopwords, line(test_pos[0])))
+    if len(tests) == 0 or len(students) == 0:
+        return None
+
+    maxs = line(test_pos[0] + max_decal, len(tests))
+    comps = line(test_pos[0] + comp_decal, len(tests))
+
+    year, month = start_date
+    tests_start = datetime.datetime(year=year, month=month, day=1)
+    year, month = end_date
+    tests_end = datetime.datetime(year=year, month=month, day=1)
+    tests_interval = (tests_end - tests_start).days // len(tests)
+
+    dates = [tests_start + datetime.timedelta(days=test_i * tests_interval) for test_i in range(len(tests))]
+    codes = ['%s/%02d/%s' % (sheet, test_i + 1, comps[test_i]) for test_i in range(len(tests))]
+
+    # The (students x tests) block, padding rows whose trailing cells are empty
+    n = len(students)
+    rows = [line(row, len(tests)) for row in range(name_pos[0], name_pos[0] + n)]
+
+    with span('mise en forme'):
+        values = numpy.array([(row + [''] * len(tests))[:len(tests)] for row in rows], dtype=object)
+        values[(values == '') | pandas.isnull(values)] = numpy.nan
+
+        return pandas.DataFrame({
+            'name': numpy.repeat(numpy.array(students, dtype=object), len(tests)),
+            'period': sheet,
+            'date': numpy.tile(pandas.to_datetime(dates).values, n),
+            'code': codes * n,
+            'test': ['%s' % test for test in tests] * n,
+            'weight': maxs * n,
+            'skill': comps * n,
+            'result': values.ravel().tolist(),
+        }, columns=RESULTS_COLUMNS)
+
+
+def concat_results(blocks, norm_weight):
+    with span('mise en forme'):
+        df = pandas.concat(blocks, ignore_index=True) if blocks else pandas.DataFrame(columns=RESULTS_COLUMNS)
+        df['weighted_result'] = df['result'] / df['weight'] * norm_weight
+    return df
+
+
+def tests_statistics(df, keys):
+    return describe(df.dropna(), keys, 'result')[TESTS_STATISTICS]
+
+
+def normalize_results(df, by=[], compact=False, tests=None):
+    # Add the per-test statistics and the normalized result, optionally
+    # computed separately for each group of the given columns. The statistics
+    # can be given, e.g. when only some of them changed (see reload_from_xls).
+    # In compact mode, the statistics are not broadcast onto every row and the
+    # frame is passed to compact_results. In both modes, the statistics are kept
+    # in the attrs of the frame (see Statistics.results_by_date), as plain data
+    # since pandas compares and copies attrs on most operations (orient='tight'
+    # requires pandas 1.4).
+    keys = list(by) + ['date']
+    if tests is None:
+        tests = tests_statistics(df, keys)
+
+    if compact:
+        if len(keys) > 1:
+            index = pandas.MultiIndex.from_arrays([df[key].values for key in keys])
+        else:
+            index = pandas.Index(df['date'])
+        quartiles = tests.reindex(index)
+
+        ndf = df.copy()
+        median, low, high = (quartiles[column].values for column in ['50%', '25%', '75%'])
+    else:
+        ndf = df.merge(tests, how='outer', left_on=keys, right_index=True)
+        median, low, high = ndf['50%'], ndf['25%'], ndf['75%']
+
+    ndf['range'] = (high - low)
+    ndf['normalized_result'] = (ndf['result'] - median) / ndf['range']
 
     ndf['normalized_result'] = ndf['normalized_result'].where(ndf['range'] > 0, 0)
-    ndf['normalized_result'] = ndf['normalized_result'].where(ndf['result'].notnull(), pandas.np.nan)
+    ndf['normalized_result'] = ndf['normalized_result'].where(ndf['result'].notnull(), numpy.nan)
     ndf = ndf.drop('range', axis=1)
 
+    ndf = compact_results(ndf) if compact else ndf
+    ndf.attrs['tests'] = tests.to_dict(orient='tight')
     return ndf
+
+
+def compact_results(df):
+    # Lighter copy of a results frame: repeated strings are stored as categories,
+    # scores as float32, and the per-test statistics columns are dropped.
+    cdf = df.drop([column for column in TESTS_STATISTICS if column in df.columns], axis=1)
+
+    for column in ['name', 'period', 'code', 'test', 'skill', 'class', 'source']:
+        if column in cdf.columns:
+            cdf[column] = cdf[column].astype('category')
+
+    for column in ['result', 'weighted_result', 'normalized_result']:
+        cdf[column] = cdf[column].astype('float32')
+
+    return cdf
@@ -1,32 +1,100 @@
+import collections
+import inspect
+import threading
+import weakref
+
+import numpy
 import seaborn
+from functools import wraps
+from matplotlib.axes import Axes
 from matplotlib.figure import Figure
 
+from .stats import Statistics
+from .timing import span
+
+
+# Horizontal boxes, through orientation since matplotlib 3.10 (vert is deprecated there)
+HORIZONTAL = ({'orientation': 'horizontal'} if 'orientation' in inspect.signature(Axes.bxp).parameters
+              else {'vert': False})
+
+
+class FigureCache:
+    # Keep the most recently built figures, keyed by dataset and arguments.
+    # The memory used by a figure is estimated from the size of its RGBA buffer.
+    # Figures can be built from other threads (e.g. to prefetch them).
+    def __init__(self, max_size=64 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self._figures = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def __call__(self, func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(df, *args, **kwargs):
+            arguments = signature.bind(df, *args, **kwargs).arguments
+            key = (func.__name__, id(df)) + tuple((k, v) for k, v in arguments.items() if k not in ('df', 'stats'))
+
+            with self._lock:
+                entry = self._figures.get(key)
+                if entry is not None and entry[0]() is df:
+                    self._figures.move_to_end(key)
+                    return entry[1]
+
+            with span('graphique'):
+                figure = func(df, *args, **kwargs)
+            self.put(key, df, figure)
+            return figure
+
+        return wrapper
+
+    def put(self, key, df, figure):
+        width, height = figure.get_size_inches() * figure.dpi
+        size = int(width * height * 4)
+
+        with self._lock:
+            if key in self._figures:
+                self.size -= self._figures.pop(key)[2]
+
+            self._figures[key] = (weakref.ref(df), figure, size)
+            self.size += size
+
+            while self.size > self.max_size and self._figures:
+                self.size -= self._figures.popitem(last=False)[1][2]
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+            self.size = 0
+
+
+figure_cache = FigureCache()
+
+
+def set_visible(figure, gid, visible: bool):
+    # Show or hide the optional parts of a figure (e.g. 'tests', 'quartiles' or
+    # 'regression') without having to build it again. These parts are direct
+    # children of the axes: looking further (e.g. into ticks) would be slower.
+    for ax in figure.axes:
+        for artist in ax.get_children():
+            if artist.get_gid() == gid:
+                artist.set_visible(bool(visible))
+
+
+@figure_cache
+def tests_results_evolution(df, skill: str, display_tests: bool, display_quartiles: bool, stats=None):
+    stats = Statistics(df) if stats is None else stats
 
-def tests_results_evolution(df, skill: str, display_tests: bool, display_quartiles: bool):
     fig = Figure(figsize=(10, 5), dpi=80)
     ax = fig.add_subplot(111)
 
-    if skill is not None:
-        adf = df.query('skill == "%s"' % skill)
-    else:
-        adf = df
-
-    ndf = (
-        adf[['date', 'weighted_result']]
-            .dropna()
-            .groupby(['date'])
-            .describe()
-            .unstack()
-            .loc[:, ('weighted_result', ['mean', '25%', '50%', '75%'])]
-            .T
-            .reset_index(level=0, drop=True)
-            .T
-    )
+    ndf = stats.evolution(skill)
+    tests = stats.tests if skill is None else stats.tests[stats.tests['skill'] == skill]
 
     ax = ndf[['mean', '50%']].plot(style=['b--', 'g'], ax=ax)
 
-    if display_quartiles:
-        ax.fill_between(ndf.index, ndf['25%'], ndf['75%'], color='green', alpha='0.1')
+    ax.fill_between(ndf.index, ndf['25%'], ndf['75%'], color='green', alpha=0.1, gid='quartiles')
 
     ax.xaxis.grid(False)
     ax.set_ylim(0, 20)
@@ -34,76 +102,148 @@ def tests_results_evolution(df, skill: str, display_tests: bool, display_quartil
     ax.set_ylabel('({})'.format(skill or 'toutes les compétences'))
     ax.xaxis.set_visible(False)
 
-    if display_tests:
-        for x in adf[['period', 'date']].groupby('period').min()['date']:
-            ax.axvline(x, 0, 20, color='r', ls='dotted')
+    for x in tests.groupby('period', observed=True)['date'].min():
+        ax.axvline(x, 0, 20, color='r', ls='dotted', gid='tests')
+
+    for code, date in tests.drop_duplicates('date')['date'].items():
+        ax.axvline(date, -3, 20, color='b', alpha=0.1, gid='tests')
+        ax.text(date, -0.2, code, rotation=90, horizontalalignment='center', verticalalignment='top', gid='tests')
 
-        for date, row in adf.groupby(['date']).agg({'code': 'first'}).iterrows():
-            ax.axvline(date, -3, 20, color='b', alpha=0.1)
-            ax.text(date, -0.2, row['code'], rotation=90, horizontalalignment='center', verticalalignment='top')
+    set_visible(fig, 'quartiles', display_quartiles)
+    set_visible(fig, 'tests', display_tests)
 
     return fig
 
 
-def results_overview(df, normalized: bool, group_by: str, skill: str):
+@figure_cache
+def skills_evolution(df, display_tests: bool, display_quartiles: bool, stats=None):
+    # Evolution of the results of every skill, side by side and sharing their axes.
+    # The statistics of all the skills come from a single grouping.
+    stats = Statistics(df) if stats is None else stats
+
+    evolution = stats.by_date_skill
+    tests = stats.tests
+    periods = tests.groupby('period', observed=True)['date'].min()
+    skills = list(evolution.groupby(level='skill', observed=True))
+
     fig = Figure(figsize=(10, 5), dpi=80)
-    ax = fig.add_subplot(111)
-    fig.subplots_adjust(left=0.20)
+    columns = 2 if len(skills) > 1 else 1
+    rows = max(1, (len(skills) + columns - 1) // columns)
+
+    first = None
+    for i, (skill, ndf) in enumerate(skills):
+        ax = fig.add_subplot(rows, columns, i + 1, sharex=first, sharey=first)
+        first = ax if first is None else first
+
+        ndf = ndf.reset_index(level='skill', drop=True)
+        ax.plot(ndf.index, ndf['mean'], 'b--', label='mean')
+        ax.plot(ndf.index, ndf['50%'], 'g', label='50%')
+        ax.fill_between(ndf.index, ndf['25%'], ndf['75%'], color='green', alpha=0.1, gid='quartiles')
+        ax.axhline(10, color='r', alpha=0.1)
+
+        # One collection of lines per kind, rather than one line per test
+        ax.vlines(periods.values, 0, 20, color='r', linestyles='dotted', gid='tests')
+        ax.vlines(tests.loc[tests['skill'] == skill, 'date'].unique(), 0, 20, color='b', alpha=0.1, gid='tests')
+
+        ax.set_title(skill)
+        ax.xaxis.set_visible(False)
+
+    if first is not None:
+        first.set_ylim(0, 20)
+    fig.suptitle('Évolution des tests (toutes les compétences)')
+
+    set_visible(fig, 'quartiles', display_quartiles)
+    set_visible(fig, 'tests', display_tests)
+
+    return fig
 
-    minx, maxx = (-2, 2) if normalized else (0, 20)
 
-    ndf = df.sort_values(by='name').rename(columns={'weighted_result': 'bruts', 'normalized_result': 'normalisés'})
+def overview_boxes(df, normalized: bool, group_by: str, skill: str, by_median: bool = False, stats=None):
+    # Box statistics of the groups of the overview, in the order they are displayed
+    stats = Statistics(df) if stats is None else stats
 
-    if skill is not None:
-        ndf = ndf.query('skill == "%s"' % skill)
+    boxes = stats.boxes(group_by, 'normalized_result' if normalized else 'weighted_result', skill)
+    if group_by == 'code':
+        boxes = boxes.reindex([code for code in stats.tests.index if code in boxes.index])
+    if by_median:
+        boxes = boxes.sort_values('med', ascending=False, kind='mergesort')
+    return boxes
 
+
+@figure_cache
+def results_overview(df, normalized: bool, group_by: str, skill: str, by_median: bool = False, start: int = 0,
+                     count: int = None, stats=None):
+    # Only the groups from start to start + count are drawn, if count is given
+    stats = Statistics(df) if stats is None else stats
+
+    fig = Figure(figsize=(10, 5), dpi=80)
+    ax = fig.add_subplot(111)
+    fig.subplots_adjust(left=0.20)
+
+    minx, maxx = (-2, 2) if normalized else (0, 20)
     field = 'bruts' if not normalized else 'normalisés'
 
-    ax = seaborn.boxplot(data=ndf, x=field, y=group_by, orient='h', ax=ax)
+    boxes = overview_boxes(df, normalized, group_by, skill, by_median, stats=stats)
+    total = len(boxes)
+    boxes = boxes.iloc[start:] if count is None else boxes.iloc[start:start + count]
+
+    bxpstats = [dict(row, label=label) for label, row in zip(boxes.index, boxes.to_dict('records'))]
+    positions = list(range(start, start + len(bxpstats)))
+    if bxpstats:
+        artists = ax.bxp(bxpstats, positions=positions, patch_artist=True, widths=0.8,
+                         medianprops={'color': '0.25'}, flierprops={'marker': 'd', 'markersize': 4}, **HORIZONTAL)
+        # Colors depend on the position of the group, not on the visible ones
+        palette = seaborn.color_palette(n_colors=min(total, 10))
+        for box, position in zip(artists['boxes'], positions):
+            box.set_facecolor(palette[position % len(palette)])
+
+    ax.set_ylim(start + (len(bxpstats) if count is None else count) - 0.5, start - 0.5)
+    ax.set_ylabel(group_by)
+    ax.set_xlabel(field)
     ax.set_xlim(minx, maxx)
     ax.axvline((maxx - minx) / 2, color='r', ls='dotted')
-    ax.set_title('Vue générale ({})'.format(field))
+    if count is not None and total > count:
+        ax.set_title('Vue générale ({}, {} à {} sur {})'.format(field, start + 1, start + len(bxpstats), total))
+    else:
+        ax.set_title('Vue générale ({})'.format(field))
 
     return fig
 
 
-def skills_distribution(df, by_number: bool):
-    ndf = (df
-           .drop_duplicates('code')
-           .groupby(['period', 'skill'])[['weight']]
-           .agg([sum, len])
-           .sort_index()
-           .unstack()
-           )
+@figure_cache
+def skills_distribution(df, by_number: bool, stats=None):
+    stats = Statistics(df) if stats is None else stats
 
+    ndf = stats.by_period_skill[['tests', 'weight']].unstack()
     ndf.loc['total'] = ndf.sum()
 
     fig = Figure(figsize=(10, 5), dpi=80)
     ax = fig.add_subplot(111)
 
     if by_number:
-        ndf['weight', 'len'].plot(kind='bar', title='En nombre', ax=ax)
+        ndf['tests'].plot(kind='bar', title='En nombre', ax=ax)
         ax.set_title('Répartition des compétences (en nombre)')
     else:
-        ndf['weight', 'sum'].plot(kind='bar', title='En poids', ax=ax)
+        ndf['weight'].plot(kind='bar', title='En poids', ax=ax)
         ax.set_title('Répartition des compétences (en poids)')
 
     return fig
 
 
-def student_results(df, student: str, normalized: bool, regression: bool, display_tests: bool, skill: str):
+@figure_cache
+def student_results(df, student: str, normalized: bool, regression: bool, display_tests: bool, skill: str,
+                    stats=None):
+    stats = Statistics(df) if stats is None else stats
+
     miny, maxy = (-2, 2) if normalized else (0, 20)
     field = 'bruts' if not normalized else 'normalisés'
 
+    ndf = stats.select(name=student, skill=skill)
     ndf = (
-        df.assign(temps=(df['date'] - min(df['date'])).dt.days)
+        ndf.assign(temps=(ndf['date'] - stats.tests['date'].min()).dt.days)
             .rename(columns={'weighted_result': 'bruts', 'normalized_result': 'normalisés'})
-            .query('name == "%s"' % student)
     )
 
-    if skill is not None:
-        ndf = ndf.query('skill == "%s"' % skill)
-
     fig = Figure(figsize=(10, 5), dpi=80)
     ax = fig.add_subplot(111)
 
@@ -112,24 +252,36 @@ def student_results(df, student: str, normalized: bool, regression: bool, displa
 
     if len(ndf) > 0:
         ndf.set_index('temps')[field].plot(ax=ax)
-        if regression:
-            seaborn.regplot('temps', field, data=ndf, color=seaborn.color_palette()[0], ax=ax, scatter=False,
-                            line_kws={'linestyle': '--'})
-
-    if display_tests:
-        fig.subplots_adjust(bottom=0.20)
-
-        for x in ndf[['period', 'temps']].groupby('period').min()['temps']:
-            ax.axvline(x, miny, maxy, color='r', ls='dotted')
 
-        for date, row in ndf.groupby(['temps']).agg({'code': 'first'}).iterrows():
-            ax.axvline(date, miny - 3, maxy, color='b', alpha=0.1)
-            ax.text(date, miny - (maxy - miny) / 100, row['code'], rotation=90, horizontalalignment='right',
-                    verticalalignment='top')
+        # Fitted line and its 95% confidence band, from the trends of all students
+        column = 'normalized_result' if normalized else 'weighted_result'
+        trends = stats.trends(column, skill)
+        if student in trends.index and trends.loc[student, 'count'] >= 2:
+            trend = trends.loc[student]
+            x = numpy.linspace(trend['x_min'], trend['x_max'], 100)
+            y = trend['intercept'] + trend['slope'] * x
+            band = trend['t'] * trend['stderr'] * numpy.sqrt(
+                1 / trend['count'] + (x - trend['x_mean']) ** 2 / trend['sxx'])
+            color = seaborn.color_palette()[0]
+            ax.plot(x, y, color=color, linestyle='--', gid='regression')
+            if numpy.isfinite(trend['stderr']):
+                ax.fill_between(x, y - band, y + band, color=color, alpha=0.15, linewidth=0, gid='regression')
+
+    fig.subplots_adjust(bottom=0.20)
+
+    for x in ndf[['period', 'temps']].groupby('period', observed=True).min()['temps']:
+        ax.axvline(x, miny, maxy, color='r', ls='dotted', gid='tests')
+
+    for date, row in ndf.groupby(['temps']).agg({'code': 'first'}).iterrows():
+        ax.axvline(date, miny - 3, maxy, color='b', alpha=0.1, gid='tests')
+        ax.text(date, miny - (maxy - miny) / 100, row['code'], rotation=90, horizontalalignment='right',
+                verticalalignment='top', gid='tests')
+
+    set_visible(fig, 'regression', regression)
+    set_visible(fig, 'tests', display_tests)
 
     ax.set_title('{} ({})'.format(student, skill or 'toutes les compétences'))
     ax.set_ylabel(field)
-    ax.hold(False)
     ax.xaxis.set_visible(False)
 
     return fig
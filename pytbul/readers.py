@@ -0,0 +1,468 @@
+import datetime
+import hashlib
+import html
+import os
+import re
+import xlrd
+import zipfile
+
+from xml.etree import ElementTree
+
+from .timing import span
+
+
+def open_workbook(filepath):
+    # Reader for given file, chosen after its extension
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == '.xlsx':
+        return XlsxReader(filepath)
+    elif extension == '.ods':
+        return OdsReader(filepath)
+    return XlsReader(filepath)
+
+
+class SheetReader:
+    # Readers return rows of Python values (str, int, float, bool, date, time or
+    # datetime, '' for empty cells and '#N/A' for errors), without their trailing
+    # empty cells. Missing sheets raise KeyError. Readers with random access
+    # read any range at the same cost; other ones stream the file for each call.
+    random_access = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def rows(self, sheet, start_row=0, stop_row=None, start_column=0, stop_column=None):
+        raise NotImplementedError()
+
+    def fingerprint(self, sheet):
+        # Changes when the content of the sheet changes
+        return hashlib.sha1(repr(self.rows(sheet)).encode('utf-8')).hexdigest()
+
+    def row(self, sheet, row, start_column=0, stop_column=None):
+        rows = self.rows(sheet, row, row + 1, start_column, stop_column)
+        return rows[0] if rows else []
+
+
+def _trim(cells):
+    while cells and cells[-1] == '':
+        cells.pop()
+    return cells
+
+
+def _number(value):
+    return int(value) if value.is_integer() else value
+
+
+def _serial_date(number, date1904=False):
+    # Same conversion as xlrd: times below one day, dates without time, or datetimes
+    epoch = datetime.datetime(1904, 1, 1) if date1904 else datetime.datetime(1899, 12, 30)
+    value = epoch + datetime.timedelta(seconds=round(number * 86400))
+    if number < 1:
+        return value.time()
+    return value.date() if value.time() == datetime.time() else value
+
+
+def _iso_date(text):
+    value = datetime.datetime.strptime(text[:19], '%Y-%m-%dT%H:%M:%S' if 'T' in text else '%Y-%m-%d')
+    return value.date() if value.time() == datetime.time() else value
+
+
+def _local(tag):
+    # Tag without its namespace
+    return tag.rpartition('}')[2]
+
+
+class XlsReader(SheetReader):
+    # Only the requested sheets are parsed (xlrd's on_demand mode), and only
+    # the requested ranges are converted to Python values.
+    random_access = True
+
+    def __init__(self, filepath):
+        with span('lecture'):
+            self.book = xlrd.open_workbook(filepath, on_demand=True)
+        self._sheets = {}
+
+    def close(self):
+        if self.book is not None:
+            self.book.release_resources()
+            self.book = None
+            self._sheets = {}
+
+    def _sheet(self, name):
+        if name not in self._sheets:
+            try:
+                self._sheets[name] = self.book.sheet_by_name(name)
+            except xlrd.XLRDError:
+                raise KeyError(name)
+        return self._sheets[name]
+
+    def _value(self, cell_type, value):
+        if cell_type == xlrd.XL_CELL_NUMBER:
+            return int(value) if value.is_integer() else value
+        elif cell_type == xlrd.XL_CELL_DATE:
+            date = xlrd.xldate_as_tuple(value, self.book.datemode)
+            if date[:3] == (0, 0, 0):
+                return datetime.time(*date[3:])
+            elif date[3:] == (0, 0, 0):
+                return datetime.date(*date[:3])
+            return datetime.datetime(*date)
+        elif cell_type == xlrd.XL_CELL_ERROR:
+            return '#N/A'
+        elif cell_type == xlrd.XL_CELL_BOOLEAN:
+            return bool(value)
+        return value
+
+    def rows(self, sheet, start_row=0, stop_row=None, start_column=0, stop_column=None):
+        with span('lecture'):
+            return self._rows(sheet, start_row, stop_row, start_column, stop_column)
+
+    def _rows(self, sheet, start_row, stop_row, start_column, stop_column):
+        # Rows are returned without their trailing empty cells, as pyexcel does
+        sheet = self._sheet(sheet)
+        stop_row = sheet.nrows if stop_row is None else min(stop_row, sheet.nrows)
+
+        rows = []
+        for row in range(start_row, stop_row):
+            length = sheet.row_len(row)
+            stop = length if stop_column is None else min(stop_column, length)
+            if stop <= start_column:
+                rows.append([])
+                continue
+
+            types = sheet.row_types(row, start_column, stop)
+            values = sheet.row_values(row, start_column, stop)
+            rows.append(_trim([self._value(t, v) for t, v in zip(types, values)]))
+        return rows
+
+    def fingerprint(self, name):
+        # Hash of the raw records of a sheet, computed without parsing the sheet.
+        # Its strings are stored in a table shared by all sheets, hashed as well.
+        names = self.book.sheet_names()
+        if name not in names:
+            raise KeyError(name)
+
+        mem, positions = getattr(self.book, 'mem', None), getattr(self.book, '_sh_abs_posn', None)
+        if mem is None or positions is None:
+            sheet = self._sheet(name)
+            return hashlib.sha1(repr([sheet.row_values(row) for row in range(sheet.nrows)]).encode('utf-8')).hexdigest()
+
+        start = positions[names.index(name)]
+        stop = min([position for position in positions if position > start] + [len(mem)])
+        digest = hashlib.sha1(mem[start:stop])
+        digest.update(repr(self.book._sharedstrings).encode('utf-8'))
+        return digest.hexdigest()
+
+
+# Built-in number formats of dates and times
+XLSX_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+
+
+def _is_date_format(code):
+    # Custom number formats are dates if they use a date or time field
+    code = re.sub(r'"[^"]*"|\[[^\]]*\]|\\.|_.|\*.', '', code)
+    return re.search(r'[dmyhs]', code, re.IGNORECASE) is not None
+
+
+def _column_index(reference):
+    # Index of the column of a cell reference, e.g. 'AB12' -> 27
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+
+class XlsxReader(SheetReader):
+    # Sheets are streamed from the archive: rows after the requested ones are not
+    # read, and rows are discarded once converted. Only the shared strings and
+    # the cell styles are kept in memory.
+    def __init__(self, filepath):
+        with span('lecture'):
+            self.archive = zipfile.ZipFile(filepath)
+            self._paths, self._date1904 = self._workbook()
+        self._strings = None
+        self._styles = None
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def _workbook(self):
+        relationships = ElementTree.fromstring(self.archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {relationship.get('Id'): relationship.get('Target') for relationship in relationships}
+
+        paths, date1904 = {}, False
+        for element in ElementTree.fromstring(self.archive.read('xl/workbook.xml')).iter():
+            if _local(element.tag) == 'workbookPr':
+                date1904 = element.get('date1904') in ('1', 'true')
+            elif _local(element.tag) == 'sheet':
+                target = next(targets[value] for key, value in element.attrib.items() if _local(key) == 'id')
+                paths[element.get('name')] = target[1:] if target.startswith('/') else 'xl/' + target
+        return paths, date1904
+
+    def _shared_strings(self):
+        if self._strings is None:
+            self._strings = []
+            if 'xl/sharedStrings.xml' in self.archive.namelist():
+                with self.archive.open('xl/sharedStrings.xml') as f:
+                    for _, element in ElementTree.iterparse(f):
+                        if _local(element.tag) == 'si':
+                            # Plain text, or rich text runs (phonetic runs are ignored)
+                            texts = [child for child in element if _local(child.tag) == 't']
+                            texts += [t for child in element if _local(child.tag) == 'r'
+                                      for t in child if _local(t.tag) == 't']
+                            self._strings.append(''.join(t.text or '' for t in texts))
+                            element.clear()
+        return self._strings
+
+    def _date_styles(self):
+        # Indexes of the cell styles whose number format is a date
+        if self._styles is None:
+            self._styles = set()
+            if 'xl/styles.xml' in self.archive.namelist():
+                root = ElementTree.fromstring(self.archive.read('xl/styles.xml'))
+                formats = {int(element.get('numFmtId')): element.get('formatCode', '')
+                           for element in root.iter() if _local(element.tag) == 'numFmt'}
+                for styles in root.iter():
+                    if _local(styles.tag) == 'cellXfs':
+                        for index, style in enumerate(styles):
+                            number_format = int(style.get('numFmtId', 0))
+                            if number_format in XLSX_DATE_FORMATS or _is_date_format(formats.get(number_format, '')):
+                                self._styles.add(index)
+        return self._styles
+
+    def _value(self, cell):
+        kind = cell.get('t', 'n')
+        value = None
+        for child in cell:
+            if _local(child.tag) == 'v':
+                value = child.text
+            elif _local(child.tag) == 'is':
+                return ''.join(t.text or '' for t in child.iter() if _local(t.tag) == 't')
+
+        if value is None:
+            return ''
+        elif kind == 's':
+            return self._shared_strings()[int(value)]
+        elif kind == 'str':
+            return value
+        elif kind == 'b':
+            return value == '1'
+        elif kind == 'e':
+            return '#N/A'
+        elif kind == 'd':
+            return _iso_date(value)
+        elif int(cell.get('s', 0)) in self._date_styles():
+            return _serial_date(float(value), self._date1904)
+        return _number(float(value))
+
+    def rows(self, sheet, start_row=0, stop_row=None, start_column=0, stop_column=None):
+        with span('lecture'):
+            return self._rows(sheet, start_row, stop_row, start_column, stop_column)
+
+    def _rows(self, sheet, start_row, stop_row, start_column, stop_column):
+        if sheet not in self._paths:
+            raise KeyError(sheet)
+
+        rows = []
+        row_index = -1
+        with self.archive.open(self._paths[sheet]) as f:
+            for _, element in ElementTree.iterparse(f):
+                if _local(element.tag) != 'row':
+                    continue
+
+                row_index = int(element.get('r')) - 1 if element.get('r') else row_index + 1
+                if stop_row is not None and row_index >= stop_row:
+                    break
+                elif row_index >= start_row:
+                    # Rows without any cell are not stored
+                    rows.extend([] for _ in range(row_index - start_row - len(rows)))
+                    rows.append(self._cells(element, start_column, stop_column))
+                element.clear()
+        return rows
+
+    def _cells(self, row, start_column, stop_column):
+        cells = []
+        column = -1
+        for cell in row:
+            if _local(cell.tag) != 'c':
+                continue
+            column = _column_index(cell.get('r')) if cell.get('r') else column + 1
+            if column < start_column:
+                continue
+            elif stop_column is not None and column >= stop_column:
+                break
+            cells.extend('' for _ in range(column - start_column - len(cells)))
+            cells.append(self._value(cell))
+        return _trim(cells)
+
+    def fingerprint(self, sheet):
+        # Computed from the checksums of the archive members, without reading them
+        if sheet not in self._paths:
+            raise KeyError(sheet)
+
+        members = [self._paths[sheet], 'xl/sharedStrings.xml', 'xl/styles.xml', 'xl/workbook.xml']
+        names = self.archive.namelist()
+        infos = [(member, self.archive.getinfo(member).CRC, self.archive.getinfo(member).file_size)
+                 for member in members if member in names]
+        return hashlib.sha1(repr(infos).encode('utf-8')).hexdigest()
+
+
+ODS_TABLE = '{urn:oasis:names:tc:opendocument:xmlns:table:1.0}'
+ODS_OFFICE = '{urn:oasis:names:tc:opendocument:xmlns:office:1.0}'
+ODS_TEXT = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+
+
+def _ods_text(element):
+    parts = [element.text or '']
+    for child in element:
+        if child.tag == ODS_TEXT + 's':
+            parts.append(' ' * int(child.get(ODS_TEXT + 'c', 1)))
+        elif child.tag == ODS_TEXT + 'tab':
+            parts.append('\t')
+        elif child.tag == ODS_TEXT + 'line-break':
+            parts.append('\n')
+        elif child.tag != ODS_OFFICE + 'annotation':
+            parts.append(_ods_text(child))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+class OdsReader(SheetReader):
+    # All the sheets are stored in content.xml, which is streamed until the
+    # requested rows are read. Rows are discarded once converted, and repeated
+    # empty rows or cells (e.g. up to the end of the sheet) are not expanded.
+    def __init__(self, filepath):
+        with span('lecture'):
+            self.archive = zipfile.ZipFile(filepath)
+        self._fingerprints = None
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+
+    def fingerprint(self, sheet):
+        # Hash of the raw XML of each table, found by scanning content.xml once
+        # instead of parsing it (cells store their typed value, so styles do not matter)
+        if self._fingerprints is None:
+            self._fingerprints = self._table_fingerprints()
+        if not self._fingerprints:
+            return super().fingerprint(sheet)
+        return self._fingerprints[sheet]
+
+    def _table_fingerprints(self):
+        content = self.archive.read('content.xml')
+
+        fingerprints = {}
+        depth, start, name = 0, None, None
+        for match in re.finditer(rb'<(/?)table:table(?=[\s/>])([^>]*?)(/?)>', content):
+            closing, attributes, empty = match.groups()
+            if not closing and depth == 0:
+                start = match.start()
+                name = re.search(rb'table:name="([^"]*)"', attributes)
+                name = html.unescape(name.group(1).decode('utf-8')) if name else None
+            if not closing and not empty:
+                depth += 1
+                continue
+            elif closing:
+                depth -= 1
+            if depth == 0 and name is not None:
+                fingerprints[name] = hashlib.sha1(content[start:match.end()]).hexdigest()
+        return fingerprints
+
+    def _value(self, cell):
+        kind = cell.get(ODS_OFFICE + 'value-type')
+        if kind is None:
+            return ''
+        elif kind in ('float', 'percentage', 'currency'):
+            return _number(float(cell.get(ODS_OFFICE + 'value')))
+        elif kind == 'date':
+            return _iso_date(cell.get(ODS_OFFICE + 'date-value'))
+        elif kind == 'time':
+            match = re.match(r'PT(\d+)H(\d+)M(\d+)', cell.get(ODS_OFFICE + 'time-value', ''))
+            if match and int(match.group(1)) < 24:
+                return datetime.time(*map(int, match.groups()))
+        elif kind == 'boolean':
+            return cell.get(ODS_OFFICE + 'boolean-value') == 'true'
+        return '\n'.join(_ods_text(p) for p in cell if p.tag == ODS_TEXT + 'p')
+
+    def rows(self, sheet, start_row=0, stop_row=None, start_column=0, stop_column=None):
+        with span('lecture'):
+            return self._rows(sheet, start_row, stop_row, start_column, stop_column)
+
+    def _rows(self, sheet, start_row, stop_row, start_column, stop_column):
+        rows = []
+        found = False
+        table = None
+        row_index = 0
+        empty_rows = 0
+
+        with self.archive.open('content.xml') as f:
+            for event, element in ElementTree.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == ODS_TABLE + 'table':
+                        table = element.get(ODS_TABLE + 'name')
+                        found = found or table == sheet
+                    continue
+
+                if element.tag == ODS_TABLE + 'table':
+                    if table == sheet:
+                        break
+                    table = None
+                    element.clear()
+                elif element.tag == ODS_TABLE + 'table-row':
+                    if table == sheet:
+                        repeated = int(element.get(ODS_TABLE + 'number-rows-repeated', 1))
+                        first = max(row_index, start_row)
+                        last = row_index + repeated if stop_row is None else min(row_index + repeated, stop_row)
+                        row_index += repeated
+
+                        if last > first:
+                            cells = self._cells(element, start_column, stop_column)
+                            if cells:
+                                rows.extend([] for _ in range(empty_rows))
+                                rows.extend(list(cells) for _ in range(last - first))
+                                empty_rows = 0
+                            else:
+                                empty_rows += last - first
+                        if stop_row is not None and row_index >= stop_row:
+                            break
+                    element.clear()
+
+        if not found:
+            raise KeyError(sheet)
+        return rows
+
+    def _cells(self, row, start_column, stop_column):
+        cells = []
+        column = 0
+        empty_cells = 0
+        for cell in row:
+            if cell.tag not in (ODS_TABLE + 'table-cell', ODS_TABLE + 'covered-table-cell'):
+                continue
+
+            repeated = int(cell.get(ODS_TABLE + 'number-columns-repeated', 1))
+            first = max(column, start_column)
+            last = column + repeated if stop_column is None else min(column + repeated, stop_column)
+            column += repeated
+
+            if last > first:
+                value = self._value(cell)
+                if value == '':
+                    empty_cells += last - first
+                else:
+                    cells.extend('' for _ in range(empty_cells))
+                    cells.extend(value for _ in range(last - first))
+                    empty_cells = 0
+            if stop_column is not None and column >= stop_column:
+                break
+        return cells
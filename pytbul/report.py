@@ -0,0 +1,79 @@
+import argparse
+import os
+import re
+
+from . import workers
+from .loader import class_names, load_from_xls
+
+
+def _render(task):
+    # The figure is built once, and saved in every requested format
+    path, function, kwargs, filepaths = task
+    figure = workers.figure(path, function, kwargs)
+    for filepath in filepaths:
+        figure.savefig(filepath, bbox_inches='tight')
+    return filepaths
+
+
+def _filename(text):
+    return re.sub(r'[^\w\- ]+', '_', str(text)).strip() or '_'
+
+
+def report_tasks(path, df, output, formats, normalized):
+    # One chart per student and per skill, plus the class-wide charts
+    directory = os.path.join(output, _filename(os.path.splitext(os.path.basename(path))[0]))
+    skills = [None] + sorted(df['skill'].dropna().unique())
+    students = sorted(df['name'].dropna().unique())
+
+    charts = []
+    for skill in skills:
+        skill_name = _filename(skill or 'toutes')
+        charts.append(('tests_results_evolution',
+                       dict(skill=skill, display_tests=True, display_quartiles=True),
+                       os.path.join(directory, 'evolution', skill_name)))
+        for group_by in ['name', 'code']:
+            charts.append(('results_overview',
+                           dict(normalized=normalized, group_by=group_by, skill=skill),
+                           os.path.join(directory, 'overview-' + group_by, skill_name)))
+        for student in students:
+            charts.append(('student_results',
+                           dict(student=student, normalized=normalized, regression=True, display_tests=True,
+                                skill=skill),
+                           os.path.join(directory, 'students', _filename(student), skill_name)))
+
+    for function, kwargs, filepath in charts:
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        yield path, function, kwargs, [filepath + '.' + extension for extension in formats]
+
+
+def generate_reports(paths, output, *, formats=('png',), normalized=False, max_workers=None, **options):
+    # Reports are written in a directory named after their file, which must differ
+    # once made a valid file name as well
+    class_names([_filename(name) for name in class_names(paths)])
+
+    datasets = {path: load_from_xls(path, **options) for path in paths}
+
+    tasks = []
+    for path, df in datasets.items():
+        tasks.extend(report_tasks(path, df, output, formats, normalized))
+
+    with workers.pool(datasets, max_workers) as executor:
+        return [filepath for filepaths in executor.map(_render, tasks, chunksize=16) for filepath in filepaths]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='report', description='Génère les graphiques de bulletins scolaires.')
+    parser.add_argument('files', nargs='+', help='fichiers à traiter, un par classe')
+    parser.add_argument('-o', '--output', default='rapports', help='répertoire de destination (défaut: rapports)')
+    parser.add_argument('-f', '--format', action='append', choices=['png', 'pdf'],
+                        help='format des graphiques, peut être répété (défaut: png)')
+    parser.add_argument('-n', '--normalized', action='store_true', help='utiliser les résultats normalisés')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='nombre de processus (défaut: un par cœur)')
+    args = parser.parse_args(argv[1:])
+
+    try:
+        files = generate_reports(args.files, args.output, formats=args.format or ['png'],
+                                 normalized=args.normalized, max_workers=args.jobs)
+    except ValueError as e:
+        parser.error(str(e))
+    print('{} graphiques générés dans {}'.format(len(files), args.output))
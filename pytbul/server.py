@@ -0,0 +1,238 @@
+import argparse
+import asyncio
+import collections
+import http
+import io
+import json
+import os
+
+from functools import partial
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from . import workers
+from .loader import class_names, load_from_xls
+
+
+# Figures and statistics that can be requested, with their parameters and their
+# default values. Parameters without default value (None) are optional strings.
+FIGURES = {
+    'tests_results_evolution': {'skill': None, 'display_tests': True, 'display_quartiles': True},
+    'skills_evolution': {'display_tests': True, 'display_quartiles': True},
+    'results_overview': {'normalized': False, 'group_by': 'name', 'skill': None, 'by_median': False},
+    'skills_distribution': {'by_number': True},
+    'student_results': {'student': None, 'normalized': False, 'regression': True, 'display_tests': True,
+                        'skill': None},
+}
+STATISTICS = {
+    'tests': {},
+    'by_code': {},
+    'evolution': {'skill': None},
+    'boxes': {'group_by': 'name', 'field': 'weighted_result', 'skill': None},
+    'trends': {'field': 'weighted_result', 'skill': None},
+}
+REQUIRED = {'student'}
+CHOICES = {
+    'group_by': ['name', 'code'],
+    'field': ['weighted_result', 'normalized_result'],
+}
+
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+JSON = 'application/json; charset=utf-8'
+
+
+def _render(task):
+    name, function, kwargs, extension = task
+    output = io.BytesIO()
+    workers.figure(name, function, kwargs).savefig(output, format=extension, bbox_inches='tight')
+    return output.getvalue()
+
+
+def _statistics(task):
+    name, table, kwargs = task
+    table = getattr(workers.statistics(name), table)
+    table = table(**kwargs) if callable(table) else table
+    return table.reset_index().to_json(orient='records', date_format='iso').encode('utf-8')
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _arguments(query, defaults):
+    # Keyword arguments from the parameters of a query, converted after their default value
+    kwargs = dict(defaults)
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        if key not in defaults:
+            raise HTTPError(400, 'Paramètre inconnu : {}'.format(key))
+        elif isinstance(defaults[key], bool):
+            if value.lower() not in ('1', 'true', 'oui', '0', 'false', 'non'):
+                raise HTTPError(400, 'Valeur booléenne attendue pour {} : {}'.format(key, value))
+            kwargs[key] = value.lower() in ('1', 'true', 'oui')
+        elif key in CHOICES and value not in CHOICES[key]:
+            raise HTTPError(400, 'Valeur invalide pour {} : {}'.format(key, value))
+        else:
+            kwargs[key] = value or None
+
+    for key in REQUIRED & set(defaults):
+        if kwargs[key] is None:
+            raise HTTPError(400, 'Paramètre manquant : {}'.format(key))
+    return kwargs
+
+
+class ResponseCache:
+    # Keep the most recently requested responses, up to max_size bytes. Responses
+    # being computed are kept as well, so that concurrent identical requests
+    # wait for the same computation.
+    def __init__(self, max_size=64 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self._responses = collections.OrderedDict()
+        self._sizes = {}
+
+    def __len__(self):
+        return len(self._responses)
+
+    async def get(self, key, compute):
+        response = self._responses.get(key)
+        if response is None:
+            response = asyncio.ensure_future(compute())
+            self._responses[key] = response
+            response.add_done_callback(partial(self._done, key))
+        else:
+            self._responses.move_to_end(key)
+        # A client going away does not cancel a computation others may wait for
+        return await asyncio.shield(response)
+
+    def _done(self, key, response):
+        if self._responses.get(key) is not response:
+            return
+        if response.cancelled() or response.exception() is not None:
+            del self._responses[key]
+            return
+
+        self._sizes[key] = len(response.result()[1])
+        self.size += self._sizes[key]
+
+        # Remove least recently used responses, but not the ones being computed
+        for old_key in [k for k in self._responses if k in self._sizes]:
+            if self.size <= self.max_size:
+                break
+            del self._responses[old_key]
+            self.size -= self._sizes.pop(old_key)
+
+
+class Server:
+    # Minimal HTTP server: one GET request per connection, answered with JSON or
+    # with a figure. Statistics and figures are computed in a pool of processes.
+    #   /                                        datasets, with their students and skills
+    #   /<dataset>/statistics/<table>?...        see STATISTICS
+    #   /<dataset>/figures/<function>.png?...    see FIGURES, also .svg
+    def __init__(self, datasets, executor, cache):
+        self.datasets = datasets
+        self.executor = executor
+        self.cache = cache
+        self.index = json.dumps({
+            name: {
+                'rows': len(df),
+                'students': sorted(df['name'].dropna().unique().tolist()),
+                'skills': sorted(df['skill'].dropna().unique().tolist()),
+            }
+            for name, df in datasets.items()
+        }).encode('utf-8')
+
+    async def run(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        try:
+            request = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()).strip():
+                pass
+
+            try:
+                if len(request) != 3:
+                    raise HTTPError(400, 'Requête invalide')
+                elif request[0] != 'GET':
+                    raise HTTPError(405, 'Seule la méthode GET est acceptée')
+                content_type, body = await self.respond(request[1])
+                status = 200
+            except HTTPError as e:
+                status, content_type, body = e.status, JSON, json.dumps({'error': str(e)}).encode('utf-8')
+
+            headers = 'HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'
+            headers = headers.format(status, http.HTTPStatus(status).phrase, content_type, len(body))
+            writer.write(headers.encode('latin-1'))
+            writer.write(body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, target):
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        if not parts:
+            return JSON, self.index
+        elif len(parts) != 3 or parts[0] not in self.datasets:
+            raise HTTPError(404, 'Ressource introuvable : {}'.format(url.path))
+
+        name, kind, resource = parts
+        if kind == 'statistics' and resource in STATISTICS:
+            kwargs = _arguments(url.query, STATISTICS[resource])
+            task = _statistics, (name, resource, kwargs)
+            content_type = JSON
+        elif kind == 'figures' and os.path.splitext(resource)[0] in FIGURES:
+            function, extension = os.path.splitext(resource)
+            if extension[1:] not in FORMATS:
+                raise HTTPError(404, 'Format inconnu : {}'.format(extension))
+            kwargs = _arguments(url.query, FIGURES[function])
+            task = _render, (name, function, kwargs, extension[1:])
+            content_type = FORMATS[extension[1:]]
+        else:
+            raise HTTPError(404, 'Ressource introuvable : {}'.format(url.path))
+
+        # Identical requests share their key, whatever the order of their parameters
+        key = (name, kind, resource, tuple(sorted(kwargs.items())))
+        return await self.cache.get(key, partial(self.compute, content_type, *task))
+
+    async def compute(self, content_type, func, task):
+        try:
+            body = await asyncio.get_running_loop().run_in_executor(self.executor, func, task)
+        except KeyError as e:
+            raise HTTPError(404, 'Introuvable : {}'.format(e))
+        except (ValueError, TypeError) as e:
+            raise HTTPError(400, str(e))
+        except Exception as e:
+            raise HTTPError(500, '{}: {}'.format(type(e).__name__, e))
+        return content_type, body
+
+
+def serve(paths, host='127.0.0.1', port=8000, *, max_workers=None, cache_size=64 * 1024 * 1024, **options):
+    # Datasets are named after their file, and loaded once for all the workers
+    datasets = {name: load_from_xls(path, **options) for name, path in zip(class_names(paths), paths)}
+
+    with workers.pool(datasets, max_workers) as executor:
+        server = Server(datasets, executor, ResponseCache(cache_size))
+        print('Serveur disponible sur http://{}:{}/'.format(host, port))
+        try:
+            asyncio.run(server.run(host, port))
+        except KeyboardInterrupt:
+            pass
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='serve', description='Sert les statistiques et les graphiques de '
+                                                               'bulletins scolaires.')
+    parser.add_argument('files', nargs='+', help='fichiers à servir, un par classe')
+    parser.add_argument('--host', default='127.0.0.1', help='adresse d\'écoute (défaut: 127.0.0.1)')
+    parser.add_argument('-p', '--port', type=int, default=8000, help='port d\'écoute (défaut: 8000)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='nombre de processus (défaut: un par cœur)')
+    parser.add_argument('--cache', type=int, default=64, help='taille du cache des réponses, en Mo (défaut: 64)')
+    args = parser.parse_args(argv[1:])
+
+    serve(args.files, args.host, args.port, max_workers=args.jobs, cache_size=args.cache * 1024 * 1024)
@@ -0,0 +1,231 @@
+import threading
+
+import numpy
+import pandas
+
+
+STATISTICS = ['count', 'mean', '25%', '50%', '75%']
+
+
+def describe(df, keys, field):
+    # Count, mean and quartiles of given field for each group of keys
+    grouped = df.dropna(subset=[field]).groupby(keys, observed=True)[field]
+    return pandas.DataFrame({
+        'count': grouped.count(),
+        'mean': grouped.mean(),
+        '25%': grouped.quantile(0.25),
+        '50%': grouped.median(),
+        '75%': grouped.quantile(0.75),
+    }, columns=STATISTICS)
+
+
+def loaded_tests(df):
+    # Per-test statistics a frame was normalized with, kept by the loader in the
+    # attrs of the frame (see loader.normalize_results), or None
+    if 'tests' not in df.attrs:
+        return None
+    return pandas.DataFrame.from_dict(df.attrs['tests'], orient='tight')
+
+
+def box_statistics(df, group_by, field, whis=1.5):
+    # Box statistics (as expected by matplotlib's Axes.bxp) for each group,
+    # computed for all groups at once instead of one group at a time.
+    values = df[[group_by, field]].dropna()
+    grouped = values.groupby(group_by, observed=True)[field]
+
+    boxes = pandas.DataFrame({
+        'mean': grouped.mean(),
+        'q1': grouped.quantile(0.25),
+        'med': grouped.median(),
+        'q3': grouped.quantile(0.75),
+    })
+    iqr = boxes['q3'] - boxes['q1']
+    low = (boxes['q1'] - whis * iqr).reindex(values[group_by]).values
+    high = (boxes['q3'] + whis * iqr).reindex(values[group_by]).values
+
+    inside = (values[field] >= low) & (values[field] <= high)
+    boxes['whislo'] = values[inside].groupby(group_by, observed=True)[field].min().reindex(boxes.index).fillna(boxes['q1'])
+    boxes['whishi'] = values[inside].groupby(group_by, observed=True)[field].max().reindex(boxes.index).fillna(boxes['q3'])
+
+    fliers = values[~inside].groupby(group_by, observed=True)[field].apply(list)
+    boxes['fliers'] = [numpy.asarray(fliers.get(group, [])) for group in boxes.index]
+
+    return boxes
+
+
+def t_quantile(dof):
+    # 97.5% quantile of Student's t distribution (for 95% confidence intervals),
+    # exact for 1 and 2 degrees of freedom, and from its Cornish-Fisher expansion
+    # otherwise (error below 0.005).
+    dof = numpy.asarray(dof, dtype=float)
+    z = 1.959963984540054
+    terms = [
+        (z ** 3 + z) / 4,
+        (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96,
+        (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384,
+        (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / 92160,
+    ]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t = z + sum(term / dof ** (i + 1) for i, term in enumerate(terms))
+    t = numpy.where(dof == 1, 12.706204736174698, numpy.where(dof == 2, 4.302652729749464, t))
+    return numpy.where(dof >= 1, t, numpy.nan)
+
+
+def trends(df, keys, x, y):
+    # Ordinary least squares fit of y against x for each group of keys, computed
+    # for all the groups at once from sums. The 95% confidence band of the fitted
+    # line at x0 is  intercept + slope * x0 +- t * stderr * sqrt(1 / count + (x0 - x_mean) ** 2 / sxx)
+    data = df[list(keys) + [x, y]].dropna(subset=[x, y])
+    data = data.assign(_x=data[x].astype(float), _y=data[y].astype(float))
+    data = data.assign(_xx=data['_x'] ** 2, _xy=data['_x'] * data['_y'], _yy=data['_y'] ** 2)
+
+    grouped = data.groupby(list(keys), observed=True)
+    sums = grouped[['_x', '_y', '_xx', '_xy', '_yy']].sum()
+    count = grouped['_y'].count()
+
+    x_mean, y_mean = sums['_x'] / count, sums['_y'] / count
+    sxx = sums['_xx'] - count * x_mean ** 2
+    sxy = sums['_xy'] - count * x_mean * y_mean
+    syy = sums['_yy'] - count * y_mean ** 2
+
+    slope = (sxy / sxx).where(sxx > 0)
+    residuals = (syy - slope * sxy).clip(lower=0)
+    stderr = numpy.sqrt(residuals / (count - 2)).where(count > 2)
+    t = t_quantile(count - 2)
+
+    return pandas.DataFrame({
+        'count': count,
+        'mean': y_mean,
+        'slope': slope,
+        'intercept': y_mean - slope * x_mean,
+        'slope_low': slope - t * stderr / numpy.sqrt(sxx),
+        'slope_high': slope + t * stderr / numpy.sqrt(sxx),
+        'stderr': stderr,
+        't': t,
+        'x_mean': x_mean,
+        'sxx': sxx,
+        'x_min': grouped['_x'].min(),
+        'x_max': grouped['_x'].max(),
+    })
+
+
+def student_summary(df):
+    # Mean raw and normalized results of each student for each skill, percentile
+    # rank (above 0, up to 100) of the mean raw result among the students, for the
+    # same skill, and number of tests without result.
+    grouped = df.groupby(['name', 'skill'], observed=True)
+    summary = grouped[['weighted_result', 'normalized_result']].mean()
+    summary.insert(0, 'tests', grouped.size())
+    summary.insert(1, 'missing', summary['tests'] - grouped['result'].count())
+    summary['rank'] = summary.groupby(level='skill', observed=True)['weighted_result'].rank(pct=True) * 100
+    return summary
+
+
+class Statistics:
+    # Statistics of a loaded dataset, shared by the plotting functions. Each
+    # table is computed the first time it is needed, then kept. Tables can be
+    # requested from several threads (e.g. to prefetch figures).
+    def __init__(self, df):
+        self.df = df
+        self._tables = {}
+        self._lock = threading.RLock()
+
+    def _table(self, key, func, *args):
+        with self._lock:
+            if key not in self._tables:
+                self._tables[key] = func(*args)
+            return self._tables[key]
+
+    @property
+    def tests(self):
+        # One row per test, with its date, period, skill and weight. Tests of the
+        # same date are kept in the order of the workbook.
+        return self._table('tests', lambda: (
+            self.df
+                .drop_duplicates('code')[['code', 'date', 'period', 'skill', 'test', 'weight']]
+                .sort_values(by='date', kind='mergesort')
+                .set_index('code')
+        ))
+
+    @property
+    def results_by_date(self):
+        # Statistics of the raw results, as used to normalize them. They are kept by
+        # the loader, and only computed again for frames it did not produce.
+        return self._table('results_by_date', lambda: (
+            loaded_tests(self.df) if 'tests' in self.df.attrs
+            else describe(self.df, ['date'], 'result')[['mean', '25%', '50%', '75%']]
+        ))
+
+    @property
+    def by_date(self):
+        return self._table('by_date', describe, self.df, ['date'], 'weighted_result')
+
+    @property
+    def by_date_skill(self):
+        return self._table('by_date_skill', describe, self.df, ['date', 'skill'], 'weighted_result')
+
+    @property
+    def by_code(self):
+        return self._table('by_code', lambda: (
+            self.tests.join(describe(self.df, ['code'], 'weighted_result'))
+        ))
+
+    @property
+    def by_period_skill(self):
+        return self._table('by_period_skill', lambda: (
+            self.tests
+                .groupby(['period', 'skill'], observed=True)['weight']
+                .agg(['count', 'sum'])
+                .rename(columns={'count': 'tests', 'sum': 'weight'})
+                .join(describe(self.df, ['period', 'skill'], 'weighted_result'))
+                .sort_index()
+        ))
+
+    def evolution(self, skill=None):
+        if skill is None:
+            return self.by_date
+        return self.by_date_skill.xs(skill, level='skill')
+
+    def boxes(self, group_by, field, skill=None):
+        return self._table(('boxes', group_by, field, skill), lambda: (
+            box_statistics(self.select(skill=skill), group_by, field)
+        ))
+
+    @property
+    def days(self):
+        # Time of each result, in days since the first test
+        return self._table('days', lambda: (self.df['date'] - self.tests['date'].min()).dt.days)
+
+    def trends(self, field, skill=None):
+        # Linear trend of the results of each student over time (see days), indexed
+        # by name. The trends of all students, or of all students and skills, are
+        # computed at once.
+        keys = ('name',) if skill is None else ('name', 'skill')
+        table = self._table(('trends', field, keys), lambda: (
+            trends(self.df.assign(days=self.days), keys, 'days', field)
+        ))
+        if skill is None:
+            return table
+        return table[table.index.get_level_values('skill') == skill].reset_index(level='skill', drop=True)
+
+    @property
+    def summary(self):
+        # One row per student and skill, see student_summary
+        return self._table('summary', student_summary, self.df)
+
+    def _positions(self, keys):
+        # Positions of the rows of each group, e.g. {(name, skill): array([...])}
+        return self._table(('positions', keys), lambda: (
+            self.df.groupby(list(keys) if len(keys) > 1 else keys[0], observed=True, sort=False).indices
+        ))
+
+    def select(self, name=None, skill=None):
+        # Rows of a student and/or a skill, fetched through an index built once,
+        # so the cost depends on the number of returned rows only.
+        criteria = [(key, value) for key, value in [('name', name), ('skill', skill)] if value is not None]
+        if not criteria:
+            return self.df
+
+        keys, values = zip(*criteria)
+        positions = self._positions(keys).get(values if len(values) > 1 else values[0])
+        return self.df.iloc[positions if positions is not None else []]
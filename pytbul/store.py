@@ -0,0 +1,143 @@
+import sqlite3
+
+from contextlib import closing
+
+
+# Columns of the results table, and the name of the corresponding loader columns
+COLUMNS = [
+    ('year', 'INTEGER NOT NULL', None),
+    ('class', 'TEXT NOT NULL', None),
+    ('name', 'TEXT', 'name'),
+    ('period', 'TEXT', 'period'),
+    ('date', 'TEXT', 'date'),
+    ('code', 'TEXT', 'code'),
+    ('test', 'TEXT', 'test'),
+    ('weight', 'REAL', 'weight'),
+    ('skill', 'TEXT', 'skill'),
+    ('result', 'REAL', 'result'),
+    ('weighted_result', 'REAL', 'weighted_result'),
+    ('mean', 'REAL', 'mean'),
+    ('q1', 'REAL', '25%'),
+    ('median', 'REAL', '50%'),
+    ('q3', 'REAL', '75%'),
+    ('normalized_result', 'REAL', 'normalized_result'),
+]
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS results ({})'.format(', '.join(name + ' ' + kind for name, kind, _ in COLUMNS)),
+    'CREATE INDEX IF NOT EXISTS results_partition ON results (year, class, period)',
+    'CREATE INDEX IF NOT EXISTS results_name ON results (name, skill)',
+    'CREATE INDEX IF NOT EXISTS results_skill ON results (skill, year)',
+]
+
+
+class ResultsStore:
+    # Results of several classes and school years, stored in a SQLite database.
+    # Each class of each school year is added once, and never modified. Queries
+    # are filtered by SQLite, so that only the matching rows are read.
+    # A connection is opened for each operation, so a store can be used from any thread.
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+    def _connect(self):
+        connection = sqlite3.connect(self.filepath)
+        with connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+        return connection
+
+    def contains(self, year, class_name):
+        with closing(self._connect()) as connection:
+            cursor = connection.execute('SELECT 1 FROM results WHERE year = ? AND class = ? LIMIT 1',
+                                        (year, class_name))
+            return cursor.fetchone() is not None
+
+    def add(self, df, year, class_name):
+        # Add the results of a class (as returned by the loader) for the school year
+        # starting in given year. Missing columns (e.g. in compact mode) are left empty.
+        columns = {column: name for name, _, column in COLUMNS if column is not None}
+        rows = df.reindex(columns=list(columns)).rename(columns=columns)
+        rows['date'] = rows['date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        for name, kind, _ in COLUMNS[2:]:
+            rows[name] = rows[name].astype(float if kind == 'REAL' else object)
+        rows.insert(0, 'year', year)
+        rows.insert(1, 'class', class_name)
+
+        statement = 'INSERT INTO results VALUES ({})'.format(', '.join('?' * len(COLUMNS)))
+        with closing(self._connect()) as connection, connection:
+            if connection.execute('SELECT 1 FROM results WHERE year = ? AND class = ? LIMIT 1',
+                                  (year, class_name)).fetchone() is not None:
+                raise ValueError('Results of class %s for year %d are already stored' % (class_name, year))
+            connection.executemany(statement, rows.astype(object).values.tolist())
+
+    def _where(self, filters):
+        # Each filter is either a single value or a list of accepted values
+        clauses, parameters = [], []
+        for column, value in filters.items():
+            if value is None:
+                continue
+            elif isinstance(value, (list, tuple, set)):
+                value = list(value)
+                clauses.append('{} IN ({})'.format(column, ', '.join('?' * len(value))))
+                parameters.extend(value)
+            else:
+                clauses.append('{} = ?'.format(column))
+                parameters.append(value)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), parameters
+
+    def distinct(self, column, *, year=None, class_name=None, name=None, skill=None, period=None):
+        if column not in [name for name, _, _ in COLUMNS]:
+            raise ValueError('Unknown column: %s' % column)
+
+        where, parameters = self._where({'year': year, 'class': class_name, 'name': name, 'skill': skill,
+                                         'period': period})
+        with closing(self._connect()) as connection:
+            cursor = connection.execute('SELECT DISTINCT {0} FROM results{1} ORDER BY {0}'.format(column, where),
+                                        parameters)
+            return [row[0] for row in cursor]
+
+    def query(self, *, year=None, class_name=None, name=None, skill=None, period=None):
+        # Results matching given filters, as returned by the loader plus the year and
+        # class columns. Codes and periods are only unique within a class of a school
+        # year: if several classes or years are returned, they are prefixed by them.
+        import pandas
+
+        where, parameters = self._where({'year': year, 'class': class_name, 'name': name, 'skill': skill,
+                                         'period': period})
+        columns = [name for name, _, column in COLUMNS if column is not None] + ['year', 'class']
+        with closing(self._connect()) as connection:
+            df = pandas.read_sql_query('SELECT {} FROM results{} ORDER BY date, rowid'.format(', '.join(columns), where), connection,
+                                       params=parameters, parse_dates=['date'])
+
+        df['date'] = df['date'].astype('datetime64[ns]')
+        for name, kind, _ in COLUMNS:
+            if kind == 'REAL':
+                df[name] = df[name].astype(float)
+        df = df.rename(columns={name: column for name, _, column in COLUMNS if column is not None})
+        prefix = None
+        if df['class'].nunique() > 1:
+            prefix = df['class'] + '/'
+        if df['year'].nunique() > 1:
+            prefix = df['year'].astype(str) + '/' + ('' if prefix is None else prefix)
+        if prefix is not None:
+            for column in ['period', 'code']:
+                df[column] = prefix + df[column]
+        return df
+
+
+def ingest(store, paths, year, progress=None, **options):
+    # Load the given files (one per class, named after the class) for the school
+    # year starting in given year, and add them to the store.
+    from .loader import class_names, load_from_xls, school_year_dates
+
+    classes = class_names(paths)
+    for class_name in classes:
+        if store.contains(year, class_name):
+            raise ValueError('Results of class %s for year %d are already stored' % (class_name, year))
+
+    options.setdefault('tests_dates', school_year_dates(year))
+    for i, (path, class_name) in enumerate(zip(paths, classes)):
+        if progress is not None:
+            progress(i, len(paths), 0)
+        store.add(load_from_xls(path, **options), year, class_name)
+    return classes
@@ -0,0 +1,106 @@
+import cProfile
+import pstats
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class Timings:
+    # Cumulated duration of named stages (e.g. workbook parsing, canvas drawing),
+    # shared by all threads, since the last call to reset().
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = OrderedDict()
+
+    def reset(self):
+        with self._lock:
+            self.spans = OrderedDict()
+
+    @contextmanager
+    def span(self, name):
+        # Stages are listed in the order they started, nested ones after their parent
+        with self._lock:
+            self.spans.setdefault(name, 0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.spans[name] = self.spans.get(name, 0) + duration
+
+    def summary(self):
+        with self._lock:
+            return ', '.join('{}: {:.0f} ms'.format(name, duration * 1000) for name, duration in self.spans.items())
+
+
+class Profiler:
+    # Before Python 3.12, cProfile only profiles the thread it is enabled in:
+    # functions run through Profiler.run (e.g. by worker threads) get their own
+    # profile, merged on dump. Since 3.12, the main profile sees every thread,
+    # and no other profile can be enabled meanwhile.
+    per_thread = sys.version_info < (3, 12)
+
+    def __init__(self):
+        self.active = False
+        self._lock = threading.Lock()
+        self._main = None
+        self._profiles = []
+
+    def start(self):
+        self._main = cProfile.Profile()
+        self._profiles = [self._main]
+        self.active = True
+        self._main.enable()
+
+    def stop(self, filepath):
+        self._main.disable()
+        self.active = False
+
+        with self._lock:
+            stats = pstats.Stats(self._profiles[0])
+            for profile in self._profiles[1:]:
+                stats.add(profile)
+            self._profiles = []
+        stats.dump_stats(filepath)
+
+    def run(self, func, *args, **kwargs):
+        if not self.active or not self.per_thread:
+            return func(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            # Only profiles that ran are merged
+            with self._lock:
+                self._profiles.append(profile)
+
+
+timings = Timings()
+
+# Threads may record their stages in other timings (see recorded_in)
+_local = threading.local()
+
+
+def span(name):
+    return getattr(_local, 'timings', timings).span(name)
+
+
+@contextmanager
+def recorded_in(other):
+    # Stages of the current thread are recorded in other timings, e.g. to keep
+    # background work out of the timings shown to the user
+    previous = getattr(_local, 'timings', timings)
+    _local.timings = other
+    try:
+        yield other
+    finally:
+        _local.timings = previous
+
+profiler = Profiler()
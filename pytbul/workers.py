@@ -0,0 +1,40 @@
+import concurrent.futures
+
+import matplotlib
+matplotlib.use('Agg')
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from . import plotting
+from .stats import Statistics
+
+
+# Figures and statistics of loaded datasets, computed in a pool of processes
+# (see report.py and server.py). Datasets are sent once to each process.
+
+# Datasets of the current worker process, by key, set by _init_worker
+_datasets = {}
+
+
+def _init_worker(datasets):
+    global _datasets
+    _datasets = {key: (df, Statistics(df)) for key, df in datasets.items()}
+    # Figures are built once per task, callers keep what they need
+    plotting.figure_cache.max_size = 0
+
+
+def pool(datasets, max_workers=None):
+    return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                                  initargs=(datasets,))
+
+
+def statistics(key):
+    return _datasets[key][1]
+
+
+def figure(key, function, kwargs):
+    # Figure built by given plotting function, ready to be saved
+    df, stats = _datasets[key]
+    figure = getattr(plotting, function)(df, stats=stats, **kwargs)
+    FigureCanvasAgg(figure)
+    return figure
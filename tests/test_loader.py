@@ -0,0 +1,94 @@
+import pandas
+import pytest
+
+from workbook import write_workbook
+
+from pytbul.loader import load_from_xls, load_many, read_fingerprints, reload_from_xls
+
+
+# Changed cells, and the sheets expected to be read again (all of them when students change)
+CHANGES = [
+    ({}, []),
+    ({('B2', 5, 3): 19.5}, ['B2']),
+    ({('B2', 0, 4): 'Renommé'}, ['B2']),
+    ({('B1', 6, 2): 19.5, ('B3', 7, 5): 19.5}, ['B1', 'B3']),
+    ({('B1', 6, 2): ''}, ['B1']),
+    ({('B4', 2, 3): 'C9'}, ['B4']),
+    ({('Nom', 5, 1): 'Zoé'}, ['B1', 'B2', 'B3', 'B4']),
+]
+
+
+@pytest.mark.parametrize('extension', ['xls', 'xlsx', 'ods'])
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('changes, changed', CHANGES)
+def test_reload_matches_load(tmp_path, extension, compact, changes, changed):
+    path = str(tmp_path / ('classe.' + extension))
+    options = write_workbook(path, students=30, tests=8)
+    df = load_from_xls(path, compact=compact, **options)
+    fingerprints = read_fingerprints(path, names_sheet=options['names_sheet'], tests_sheets=options['tests_sheets'])
+
+    write_workbook(path, students=30, tests=8, changes=changes)
+    reloaded, _, reread = reload_from_xls(path, df, fingerprints, compact=compact, **options)
+
+    # Strings of .xls and .xlsx files are shared by all sheets: when they change,
+    # other sheets may be read again as well
+    if all(not isinstance(value, str) for value in changes.values()):
+        assert reread == changed
+    else:
+        assert set(changed) <= set(reread)
+    expected = load_from_xls(path, compact=compact, **options)
+    pandas.testing.assert_frame_equal(reloaded, expected, check_dtype=not compact, check_categorical=False,
+                                      rtol=1e-6)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_reload_many_tests(tmp_path, compact):
+    # Codes of the 100th test and beyond do not sort after the others as strings
+    path = str(tmp_path / 'classe.xls')
+    options = write_workbook(path, students=5, tests=120)
+    df = load_from_xls(path, compact=compact, **options)
+    fingerprints = read_fingerprints(path, names_sheet=options['names_sheet'], tests_sheets=options['tests_sheets'])
+
+    write_workbook(path, students=5, tests=120, changes={('B2', 5, 3): 19.5})
+    reloaded, _, reread = reload_from_xls(path, df, fingerprints, compact=compact, **options)
+
+    assert reread == ['B2']
+    expected = load_from_xls(path, compact=compact, **options)
+    pandas.testing.assert_frame_equal(reloaded, expected, check_dtype=not compact, check_categorical=False,
+                                      rtol=1e-6)
+
+
+def test_load_many_same_names(tmp_path):
+    paths = []
+    for directory in ['a', 'b']:
+        (tmp_path / directory).mkdir()
+        paths.append(str(tmp_path / directory / 'classe.xls'))
+        options = write_workbook(paths[-1], students=5, tests=3)
+
+    with pytest.raises(ValueError):
+        load_many(paths, **options)
+
+
+def test_read_sheet_columns(tmp_path):
+    # Cells after the tests are not read from .xls files
+    from pytbul.loader import read_sheet, read_students
+    from pytbul.readers import XlsReader
+
+    class RecordingReader(XlsReader):
+        def rows(self, sheet, start_row=0, stop_row=None, start_column=0, stop_column=None):
+            calls.append((sheet, start_row, stop_row, start_column, stop_column))
+            return super().rows(sheet, start_row, stop_row, start_column, stop_column)
+
+    path = str(tmp_path / 'classe.xls')
+    options = write_workbook(path, students=5, tests=7)
+    calls = []
+    with RecordingReader(path) as reader:
+        students = read_students(reader, options['names_sheet'], options['name_pos'])
+        del calls[:]
+        block = read_sheet(reader, 'B1', options['tests_dates'][0], options['tests_dates'][1], students,
+                           tests_stopwords=options['tests_stopwords'], name_pos=options['name_pos'],
+                           test_pos=options['test_pos'], max_decal=options['max_decal'],
+                           comp_decal=options['comp_decal'])
+
+    assert len(block) == 5 * 7
+    assert calls[-1][4] == options['test_pos'][1] + 7
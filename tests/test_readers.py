@@ -0,0 +1,49 @@
+import pandas
+import pytest
+
+from workbook import write_workbook
+
+from pytbul.loader import load_from_xls
+from pytbul.readers import open_workbook
+
+
+SHEETS = ['Admin', 'Nom', 'B1', 'B2', 'B3', 'B4']
+
+
+@pytest.fixture(scope='module')
+def workbooks(tmp_path_factory):
+    # The same synthetic workbook, in every supported format
+    directory = tmp_path_factory.mktemp('workbooks')
+    paths = {extension: str(directory / ('classe.' + extension)) for extension in ['xls', 'xlsx', 'ods']}
+    options = None
+    for path in paths.values():
+        options = write_workbook(path, students=40, tests=12)
+    return paths, options
+
+
+@pytest.mark.parametrize('extension', ['xlsx', 'ods'])
+def test_rows_match_xls(workbooks, extension):
+    paths, _ = workbooks
+    with open_workbook(paths['xls']) as expected, open_workbook(paths[extension]) as reader:
+        for sheet in SHEETS:
+            assert reader.rows(sheet) == expected.rows(sheet)
+            assert reader.rows(sheet, 2, 6, 1, 5) == expected.rows(sheet, 2, 6, 1, 5)
+        assert reader.row('Nom', 3, 1, 2) == expected.row('Nom', 3, 1, 2)
+
+
+@pytest.mark.parametrize('extension', ['xls', 'xlsx', 'ods'])
+def test_missing_sheet(workbooks, extension):
+    paths, _ = workbooks
+    with open_workbook(paths[extension]) as reader:
+        with pytest.raises(KeyError):
+            reader.rows('B9')
+        with pytest.raises(KeyError):
+            reader.fingerprint('B9')
+
+
+@pytest.mark.parametrize('extension', ['xlsx', 'ods'])
+@pytest.mark.parametrize('compact', [False, True])
+def test_load_matches_xls(workbooks, extension, compact):
+    paths, options = workbooks
+    expected = load_from_xls(paths['xls'], compact=compact, **options)
+    pandas.testing.assert_frame_equal(load_from_xls(paths[extension], compact=compact, **options), expected)
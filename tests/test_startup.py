@@ -0,0 +1,11 @@
+import pytest
+
+from startup import BUDGET, DEFERRED, import_times
+
+
+def test_gui_import_time():
+    pytest.importorskip('PyQt5')
+    times = import_times('pytbul.gui')
+
+    assert [module for module in DEFERRED if module in times] == []
+    assert times['pytbul.gui'] <= BUDGET
@@ -0,0 +1,85 @@
+import numpy
+import pandas
+import pytest
+
+from workbook import write_workbook
+
+from pytbul.loader import load_from_xls
+from pytbul.stats import Statistics, t_quantile, trends
+
+
+# 97.5% quantiles of Student's t distribution, for 1 to 30 degrees of freedom
+T_TABLE = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+           2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+           2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+@pytest.fixture
+def frame():
+    # Student a has scattered results, b only two of them, and c all at the same time
+    rnd = numpy.random.RandomState(0)
+    x = numpy.array([0, 10, 25, 40, 60, 90, 120], dtype=float)
+    rows = [('a', day, 10 + 0.05 * day + rnd.normal(0, 2)) for day in x]
+    rows += [('a', 150, numpy.nan), ('b', 0, 12), ('b', 30, 15), ('c', 30, 8), ('c', 30, 11), ('c', 30, 14)]
+    return pandas.DataFrame(rows, columns=['name', 'days', 'result'])
+
+
+def test_t_quantile():
+    for dof, expected in enumerate(T_TABLE, 1):
+        assert abs(t_quantile(dof) - expected) < 0.005
+    assert numpy.isnan(t_quantile(0))
+    assert numpy.isnan(t_quantile(-1))
+
+
+def test_trends(frame):
+    table = trends(frame, ['name'], 'days', 'result')
+    data = frame[frame['name'] == 'a'].dropna()
+    x, y = data['days'].values, data['result'].values
+    n = len(x)
+
+    slope, intercept = numpy.polyfit(x, y, 1)
+    residuals = y - (intercept + slope * x)
+    stderr = numpy.sqrt((residuals ** 2).sum() / (n - 2))
+    sxx = ((x - x.mean()) ** 2).sum()
+    margin = T_TABLE[n - 3] * stderr / numpy.sqrt(sxx)
+
+    row = table.loc['a']
+    assert row['count'] == n
+    assert row['mean'] == pytest.approx(y.mean())
+    assert row['slope'] == pytest.approx(slope)
+    assert row['intercept'] == pytest.approx(intercept)
+    assert row['stderr'] == pytest.approx(stderr)
+    assert row['sxx'] == pytest.approx(sxx)
+    assert row['slope_low'] == pytest.approx(slope - margin, abs=0.005 * stderr / numpy.sqrt(sxx))
+    assert row['slope_high'] == pytest.approx(slope + margin, abs=0.005 * stderr / numpy.sqrt(sxx))
+
+
+def test_trends_two_results(frame):
+    # The line goes through both results, without confidence interval
+    row = trends(frame, ['name'], 'days', 'result').loc['b']
+    assert row['count'] == 2
+    assert row['slope'] == pytest.approx(0.1)
+    assert row['intercept'] == pytest.approx(12)
+    assert numpy.isnan(row['stderr'])
+    assert numpy.isnan(row['slope_low']) and numpy.isnan(row['slope_high'])
+
+
+def test_trends_same_time(frame):
+    # No trend when all the results are at the same time
+    row = trends(frame, ['name'], 'days', 'result').loc['c']
+    assert row['count'] == 3
+    assert row['mean'] == pytest.approx(11)
+    assert row['sxx'] == 0
+    assert numpy.isnan(row['slope']) and numpy.isnan(row['intercept'])
+    assert numpy.isnan(row['slope_low']) and numpy.isnan(row['slope_high'])
+
+
+def test_tests_order(tmp_path):
+    # With more tests than days in a period, several tests share a date
+    path = str(tmp_path / 'classe.xls')
+    options = write_workbook(path, students=3, tests=120)
+    df = load_from_xls(path, **options)
+
+    tests = Statistics(df).tests
+    assert list(tests.index) == list(df['code'].drop_duplicates())
+    assert tests['date'].duplicated().any()
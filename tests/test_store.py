@@ -0,0 +1,71 @@
+import pytest
+
+from workbook import write_workbook
+
+from pytbul.loader import load_from_xls
+from pytbul.store import ResultsStore, ingest
+
+
+@pytest.fixture
+def store(tmp_path):
+    # Two classes of 2015, and one of them again in 2016
+    paths = [str(tmp_path / '1A.xls'), str(tmp_path / '1B.xls')]
+    options = None
+    for seed, path in enumerate(paths):
+        options = write_workbook(path, students=10, tests=5, seed=seed)
+
+    store = ResultsStore(str(tmp_path / 'historique.sqlite'))
+    ingest(store, paths, 2015, **options)
+    ingest(store, paths[:1], 2016, **options)
+    return store, paths, options
+
+
+def test_query_one_class(store):
+    store, paths, options = store
+    df = store.query(year=2015, class_name='1A')
+
+    expected = load_from_xls(paths[0], **options)
+    assert list(df['code']) == list(expected['code'])
+    assert list(df['period'].unique()) == options['tests_sheets']
+
+
+def test_query_several_classes(store):
+    store, _, options = store
+    df = store.query(year=2015)
+
+    assert set(df['class']) == {'1A', '1B'}
+    assert (df['code'].str.split('/').str[0] == df['class']).all()
+    assert (df['period'] == df['class'] + '/' + df['code'].str.split('/').str[1]).all()
+    # Tests of different classes do not share codes
+    assert df.drop_duplicates('code').shape[0] == 2 * 5 * len(options['tests_sheets'])
+
+
+def test_query_several_years(store):
+    store, _, _ = store
+
+    df = store.query(class_name='1A')
+    assert (df['code'].str.split('/').str[0] == df['year'].astype(str)).all()
+    assert not df['code'].str.contains('1A').any()
+
+    df = store.query()
+    prefixes = df['year'].astype(str) + '/' + df['class'] + '/'
+    assert all(code.startswith(prefix) for code, prefix in zip(df['code'], prefixes))
+
+
+def test_ingest_twice(store):
+    store, paths, options = store
+    with pytest.raises(ValueError):
+        ingest(store, paths[1:], 2015, **options)
+
+
+def test_ingest_same_names(tmp_path):
+    paths = []
+    for directory in ['a', 'b']:
+        (tmp_path / directory).mkdir()
+        paths.append(str(tmp_path / directory / '1A.xls'))
+        options = write_workbook(paths[-1], students=5, tests=3)
+
+    store = ResultsStore(str(tmp_path / 'historique.sqlite'))
+    with pytest.raises(ValueError):
+        ingest(store, paths, 2015, **options)
+    assert store.distinct('class') == []